@@ -5,9 +5,12 @@ from pydantic import ValidationError
 from datetime import datetime
 
 from app.core.config import settings
+from app.core.principal_cache import principal_cache
 from app.core.security import ALGORITHM
 from app.models.user import User
 from app.schemas.token import TokenPayload
+from app.services.discord_client import DiscordClient, discord_client
+from app.services.discord_token_manager import DiscordTokenManager, discord_token_manager
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
@@ -17,13 +20,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """
     验证并获取当前用户
     """
+    cached_user = principal_cache.get(token)
+    if cached_user:
+        return cached_user
+    
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[ALGORITHM]
         )
         token_data = TokenPayload(**payload)
         
-        if datetime.fromtimestamp(token_data.exp) < datetime.utcnow():
+        if token_data.exp and datetime.utcfromtimestamp(token_data.exp) < datetime.utcnow():
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token expired",
@@ -49,6 +56,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
             detail="Inactive user"
         )
     
+    principal_cache.set(token, user, token_exp=token_data.exp)
     return user
 
 async def get_current_active_superuser(
@@ -62,4 +70,17 @@ async def get_current_active_superuser(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_discord_client() -> DiscordClient:
+    """
+    获取共享的 Discord 客户端（测试中可通过 dependency_overrides 替换）
+    """
+    return discord_client
+
+
+def get_discord_token_manager() -> DiscordTokenManager:
+    """
+    获取共享的 Discord 令牌管理器
+    """
+    return discord_token_manager
@@ -1,15 +1,17 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.core.config import settings
+from app.core.principal_cache import principal_cache
 from app.core.security import create_access_token
 from app.crud.user import user
 from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserResponse
 from app.services.discord_client import DiscordClient
-from app.api.deps import get_current_user
+from app.services.discord_service import DiscordService
+from app.api.deps import get_current_user, get_discord_client
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -80,17 +82,18 @@ async def discord_authorize():
 @router.get("/discord/callback", response_model=Token)
 async def discord_callback(
     code: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    discord_client: DiscordClient = Depends(get_discord_client)
 ):
     """
     处理 Discord 授权回调
     """
     try:
         # 交换授权码获取访问令牌
-        token_data = await DiscordClient.exchange_code(code)
+        token_data = await discord_client.exchange_code(code)
         
         # 获取 Discord 用户信息
-        user_info = await DiscordClient.get_user_info(token_data["access_token"])
+        user_info = await discord_client.get_user_info(token_data["access_token"])
         
         # 创建 Discord 账号
         from app.models.discord import DiscordAccount
@@ -107,6 +110,8 @@ async def discord_callback(
         # 更新用户的 Discord 账号
         current_user.discord_account = discord_account
         await current_user.save()
+        principal_cache.invalidate_user(str(current_user.id))
+        DiscordService.invalidate_servers(str(current_user.id))
         
         # 返回相同的访问令牌
         return {
@@ -1,74 +1,62 @@
+from datetime import datetime
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
-from app.api.deps import get_current_user
+from app.api.deps import (
+    get_current_user,
+    get_current_active_superuser,
+    get_discord_client,
+    get_discord_token_manager,
+)
 from app.models.user import User
-from app.models.discord import DiscordServer, DiscordChannel
+from app.models.discord import DiscordChannelAccess
 from app.schemas.discord import DiscordServerResponse, DiscordChannelResponse
+from app.services.channel_access import channel_access_buffer
 from app.services.discord_client import DiscordClient
+from app.services.discord_service import DiscordService
+from app.services.discord_token_manager import DiscordTokenManager
 
 router = APIRouter(prefix="/discord", tags=["discord"])
 
 @router.get("/servers", response_model=List[DiscordServerResponse])
 async def get_discord_servers(
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    refresh: bool = Query(False, description="跳过缓存，重新从 Discord 获取"),
+    current_user: User = Depends(get_current_user),
+    discord_client: DiscordClient = Depends(get_discord_client),
+    token_manager: DiscordTokenManager = Depends(get_discord_token_manager)
 ):
     """获取用户的 Discord 服务器列表"""
     if not current_user.discord_account:
         raise HTTPException(status_code=400, detail="Discord account not linked")
     
-    # 检查令牌是否过期
-    if current_user.discord_account.token_expires_at < datetime.utcnow():
-        try:
-            # 刷新令牌
-            token_data = await DiscordClient.refresh_discord_token(
-                current_user.discord_account.refresh_token
-            )
-            # 更新令牌
-            current_user.discord_account.access_token = token_data["access_token"]
-            current_user.discord_account.refresh_token = token_data["refresh_token"]
-            current_user.discord_account.token_expires_at = datetime.utcnow() + timedelta(seconds=token_data["expires_in"])
-            await current_user.save()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to refresh Discord token: {str(e)}")
+    # 令牌即将过期时刷新（通常已由后台任务提前刷新）
+    try:
+        await token_manager.ensure_fresh(current_user)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to refresh Discord token: {str(e)}")
     
     try:
-        # 获取服务器列表
-        guilds = await DiscordClient.get_user_guilds(current_user.discord_account.access_token)
-        
-        servers = []
-        for guild in guilds:
-            # 获取频道列表
-            channels = await DiscordClient.get_guild_channels(
-                current_user.discord_account.access_token,
-                guild["id"]
-            )
-            
-            # 过滤出文本频道
-            text_channels = [
-                DiscordChannel(
-                    channel_id=channel["id"],
-                    server_id=guild["id"],
-                    name=channel["name"],
-                    type=channel["type"],
-                    position=channel.get("position", 0),
-                    deep_link=DiscordClient.create_deep_link(guild["id"], channel["id"])
-                )
-                for channel in channels
-                if channel["type"] == 0  # 0 表示文本频道
-            ]
-            
-            server = DiscordServer(
-                server_id=guild["id"],
-                name=guild["name"],
-                icon=guild.get("icon"),
-                channels=text_channels
-            )
-            servers.append(server)
-        
-        return servers
+        # 获取服务器及频道列表（带缓存）
+        servers, errors = await DiscordService.get_servers(
+            discord_client,
+            str(current_user.id),
+            current_user.discord_account.access_token,
+            refresh=refresh
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get Discord servers: {str(e)}")
+    
+    # 部分服务器失败或超时时标记为不完整结果
+    if errors:
+        response.headers["X-Partial-Result"] = "true"
+    
+    return [
+        DiscordServerResponse.from_orm(server).copy(
+            update={"error": errors.get(server.server_id)}
+        )
+        for server in servers
+    ]
 
 @router.get("/deeplinks", response_model=List[DiscordChannelResponse])
 async def get_discord_deeplinks(
@@ -79,9 +67,11 @@ async def get_discord_deeplinks(
     if not current_user.discord_account:
         raise HTTPException(status_code=400, detail="Discord account not linked")
     
-    # 获取最近访问的频道
-    channels = await DiscordChannel.find().sort(
-        -DiscordChannel.last_accessed
+    # 获取当前用户最近访问的频道（user_id + last_accessed 复合索引）
+    channels = await DiscordChannelAccess.find(
+        DiscordChannelAccess.user_id == str(current_user.id)
+    ).sort(
+        -DiscordChannelAccess.last_accessed
     ).limit(limit).to_list()
     
     return channels
@@ -95,12 +85,20 @@ async def record_channel_access(
     if not current_user.discord_account:
         raise HTTPException(status_code=400, detail="Discord account not linked")
     
-    channel = await DiscordChannel.find_one(DiscordChannel.channel_id == channel_id)
+    channel = await channel_access_buffer.find_channel(channel_id)
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
     
-    # 更新访问时间
+    # 更新访问时间（写入缓冲区，由后台批量刷新）
     channel.last_accessed = datetime.utcnow()
-    await channel.save()
+    await channel_access_buffer.record(str(current_user.id), channel, channel.last_accessed)
     
-    return channel
\ No newline at end of file
+    return channel
+
+@router.get("/metrics")
+async def get_discord_metrics(
+    current_user: User = Depends(get_current_active_superuser),
+    discord_client: DiscordClient = Depends(get_discord_client)
+):
+    """获取 Discord 请求调度指标（需要管理员权限）"""
+    return discord_client.metrics()
@@ -1,24 +1,49 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pymongo.errors import DuplicateKeyError
 
 from app.api.deps import get_current_user, get_current_active_superuser
+from app.core.config import settings
 from app.crud.game import game
 from app.models.game import Game
 from app.models.user import User
-from app.schemas.game import GameCreate, GameUpdate, GameResponse
+from app.schemas.game import (
+    GameBulkUpsertResult,
+    GameCandidate,
+    GameCreate,
+    GameResolveRequest,
+    GameResponse,
+    GameUpdate,
+)
+from app.services.game_contexts import game_context_buffer
+from app.services.game_identifier import game_identifier
+from app.services.game_registry import game_registry
+from app.utils.pagination import encode_cursor
 
 router = APIRouter(prefix="/games", tags=["games"])
 
 @router.get("/", response_model=List[GameResponse])
 async def read_games(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取所有支持的游戏
     """
-    games = await game.get_multi(skip=skip, limit=limit)
+    try:
+        games = await game.get_multi(skip=skip, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    if games and len(games) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(games[-1].id)
     return games
 
 @router.post("/", response_model=GameResponse)
@@ -36,7 +61,33 @@ async def create_game(
             detail="Game with this package name already exists"
         )
     
-    return await game.create(obj_in=game_in)
+    try:
+        return await game.create(obj_in=game_in)
+    except DuplicateKeyError:
+        # 其他进程刚创建了同包名的游戏
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Game with this package name already exists"
+        )
+
+@router.get("/identify", response_model=List[GameCandidate])
+async def identify_game(
+    context: str = Query(..., min_length=1, description="输入框的上下文文本"),
+    package_name: Optional[str] = Query(None, description="当前应用包名，匹配的游戏优先"),
+    limit: int = Query(5, ge=1, le=settings.GAME_IDENTIFY_MAX_RESULTS),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    根据输入上下文识别游戏，返回按得分排序的候选
+    """
+    return [
+        GameCandidate(
+            game=GameResponse.parse_obj({**found_game.dict(), "id": str(found_game.id)}),
+            score=score,
+            matched_contexts=matched
+        )
+        for found_game, score, matched in game_identifier.identify(context, package_name, limit)
+    ]
 
 @router.get("/{game_id}", response_model=GameResponse)
 async def read_game(
@@ -69,7 +120,13 @@ async def update_game(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Game not found"
         )
-    return await game.update(db_obj=found_game, obj_in=game_in)
+    try:
+        return await game.update(db_obj=found_game, obj_in=game_in)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Game with this package name already exists"
+        )
 
 @router.get("/package/{package_name}", response_model=GameResponse)
 async def read_game_by_package(
@@ -87,29 +144,69 @@ async def read_game_by_package(
         )
     return found_game
 
+@router.post("/resolve", response_model=Dict[str, GameResponse])
+async def resolve_games(
+    resolve_in: GameResolveRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量通过包名获取游戏，返回以包名为键的已知游戏（未知包名不出现在结果中）
+    """
+    if len(resolve_in.package_names) > settings.GAME_RESOLVE_MAX_NAMES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.GAME_RESOLVE_MAX_NAMES} package names per request"
+        )
+    
+    found = await game.get_by_package_names(package_names=resolve_in.package_names)
+    return {
+        package_name: GameResponse.parse_obj({**found_game.dict(), "id": str(found_game.id)})
+        for package_name, found_game in found.items()
+    }
+
+@router.post("/bulk", response_model=GameBulkUpsertResult)
+async def bulk_upsert_games(
+    games_in: List[GameCreate],
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """
+    按包名批量创建或更新游戏（需要管理员权限）
+    """
+    if len(games_in) > settings.GAME_BULK_UPSERT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.GAME_BULK_UPSERT_MAX_ROWS} games per request"
+        )
+    
+    inserted, updated, unchanged = await game.bulk_upsert(objs_in=games_in)
+    return GameBulkUpsertResult(inserted=inserted, updated=updated, unchanged=unchanged)
+
 @router.post("/contexts")
 async def report_game_context(
     package_name: str,
     context: str,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
     """
     上报游戏上下文信息（用于改进识别）
-    """
-    found_game = await game.get_by_package_name(package_name=package_name)
     
-    # 如果游戏不存在，创建记录（为将来的支持）
-    if not found_game:
-        found_game = await game.create(
-            obj_in=GameCreate(
-                name=f"Unknown Game ({package_name})",
-                package_name=package_name,
-                input_contexts=[context]
-            )
+    上报先进入缓冲区，批量写入；未知游戏在写入时自动创建。
+    """
+    if not game_context_buffer.submit(package_name, context):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Context ingestion is busy, retry later",
+            headers={"Retry-After": str(math.ceil(settings.GAME_CONTEXT_FLUSH_INTERVAL_SECONDS))}
         )
-    # 如果游戏存在但上下文不在列表中，添加它
-    elif context not in found_game.input_contexts:
-        found_game.input_contexts.append(context)
-        await found_game.save()
     
-    return {"success": True, "game_id": str(found_game.id)}
\ No newline at end of file
+    found_game = game_registry.get_by_package_name(package_name)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"success": True, "game_id": str(found_game.id) if found_game else None}
+
+@router.get("/contexts/metrics")
+async def get_game_context_metrics(
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """获取上下文上报缓冲区指标（需要管理员权限）"""
+    return game_context_buffer.metrics()
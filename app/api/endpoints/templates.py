@@ -1,31 +1,60 @@
+from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_active_superuser
+from app.core.config import settings
 from app.models.user import User
 from app.models.template import Template
-from app.schemas.template import TemplateCreate, TemplateUpdate, TemplateResponse
-from app.services.template_service import TemplateService
+from app.schemas.template import (
+    TemplateCreate,
+    TemplateImportResult,
+    TemplateUpdate,
+    TemplateResponse,
+    TemplateSuggestion,
+    TemplateSyncResponse,
+)
+from app.services.game_registry import game_registry
+from app.services.template_bundles import TemplateBundleService
+from app.services.template_search import template_search_index
+from app.services.template_service import TemplateService, link_id
+from app.services.template_transfer import TemplateTransferService
+from app.utils.helpers import accepts_encoding, is_valid_object_id, to_naive_utc
+from app.utils.pagination import decode_cursor
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
 @router.get("/", response_model=List[TemplateResponse])
 async def get_templates(
+    response: Response,
     game: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
     current_user: User = Depends(get_current_user)
 ):
     """获取用户的模板列表"""
-    templates = await TemplateService.get_templates_for_user(
-        user_id=str(current_user.id),
-        game_id=game,
-        category=category,
-        skip=skip,
-        limit=limit
-    )
-    return templates
+    if game and not is_valid_object_id(game):
+        raise HTTPException(status_code=400, detail="Invalid game ID")
+    
+    try:
+        templates = await TemplateService.get_templates_for_user(
+            user_id=str(current_user.id),
+            game_id=game,
+            category=category,
+            skip=skip,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    next_cursor = TemplateService.next_user_cursor(templates, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return await TemplateService.resolve_responses(templates)
 
 @router.post("/", response_model=TemplateResponse)
 async def create_template(
@@ -43,14 +72,170 @@ async def create_template(
     )
     
     if template_in.game_id:
-        from app.models.game import Game
-        game = await Game.get(template_in.game_id)
+        game = await game_registry.find(template_in.game_id)
         if not game:
             raise HTTPException(status_code=404, detail="Game not found")
         template.game = game
     
     await template.insert()
-    return template
+    template_search_index.upsert(template)
+    if template.is_public:
+        await TemplateService.invalidate_public_templates(link_id(template.game))
+    return (await TemplateService.resolve_responses([template]))[0]
+
+@router.get("/public", response_model=List[TemplateResponse])
+async def get_public_templates(
+    response: Response,
+    game: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    sort: str = Query("usage", regex="^(usage|trending)$", description="usage 按累计使用次数，trending 按近期热度"),
+    current_user: User = Depends(get_current_user)
+):
+    """获取公共模板列表"""
+    if game and not is_valid_object_id(game):
+        raise HTTPException(status_code=400, detail="Invalid game ID")
+    
+    try:
+        templates = await TemplateService.get_public_templates(
+            game_id=game,
+            category=category,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            sort=sort
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    next_cursor = TemplateService.next_public_cursor(templates, limit, sort)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return await TemplateService.resolve_responses(templates)
+
+@router.get("/search", response_model=List[TemplateSuggestion])
+async def search_templates(
+    q: str = Query(..., min_length=1, max_length=100),
+    game: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    """搜索模板（支持输入时前缀补全），结果按使用次数排序"""
+    if game and not is_valid_object_id(game):
+        raise HTTPException(status_code=400, detail="Invalid game ID")
+    
+    return await TemplateService.search_templates(
+        q,
+        user_id=str(current_user.id),
+        game_id=game,
+        limit=limit
+    )
+
+@router.get("/sync", response_model=TemplateSyncResponse)
+async def sync_templates(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="上次同步返回的 cursor，首次同步不传"),
+    since: Optional[datetime] = Query(None, description="首次同步时只返回此时间之后的变更"),
+    game: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    增量同步：返回自上次同步以来新建、更新和删除的模板
+    
+    新游标同时放在响应头 X-Sync-Cursor 中，内容未变化返回 304 时客户端也应保存它。
+    """
+    if game and not is_valid_object_id(game):
+        raise HTTPException(status_code=400, detail="Invalid game ID")
+    
+    if since:
+        since = to_naive_utc(since)
+    
+    start = since
+    if cursor:
+        try:
+            positions = decode_cursor(cursor)
+            if len(positions) != 4 or not all(isinstance(p, datetime) for p in positions[0::2]):
+                raise ValueError("Invalid cursor")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        start = to_naive_utc(positions[2])
+    
+    # 墓碑位置早于保留期时无法知道期间的删除；模板位置不受限制，
+    # 否则首次全量同步翻到较早的模板时会被要求重新全量同步
+    retention = timedelta(days=settings.TEMPLATE_TOMBSTONE_RETENTION_DAYS)
+    if start and start < datetime.utcnow() - retention:
+        raise HTTPException(status_code=410, detail="Watermark too old, full sync required")
+    
+    templates, deleted, watermark, next_cursor, has_more = await TemplateService.sync_templates(
+        user_id=str(current_user.id),
+        since=since,
+        cursor=cursor,
+        game_id=game
+    )
+    
+    # 内容未变化时返回 304，但仍通过响应头下发推进后的游标
+    etag = TemplateService.sync_etag(templates, deleted)
+    sync_headers = {"ETag": etag, "X-Sync-Cursor": next_cursor}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=sync_headers)
+    
+    response.headers.update(sync_headers)
+    return TemplateSyncResponse(
+        templates=await TemplateService.resolve_responses(templates),
+        deleted=deleted,
+        watermark=watermark,
+        cursor=next_cursor,
+        has_more=has_more
+    )
+
+@router.get("/export")
+async def export_templates(
+    game: Optional[str] = Query(None, description="游戏包名；指定时导出该游戏的全部公共模板"),
+    current_user: User = Depends(get_current_user)
+):
+    """以 NDJSON 流式导出用户自己的模板或某个游戏的公共模板"""
+    if game:
+        found_game = await game_registry.find_by_package_name(game)
+        if not found_game:
+            raise HTTPException(status_code=404, detail="Game not found")
+        body = TemplateTransferService.export_game_templates(str(found_game.id))
+        filename = f"templates-{game}.ndjson"
+    else:
+        body = TemplateTransferService.export_user_templates(str(current_user.id))
+        filename = "templates.ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import", response_model=TemplateImportResult)
+async def import_templates(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    从 NDJSON 请求体流式导入模板，每行一个模板（字段同创建模板，可用 game_package_name 指定游戏）
+    
+    导入的模板归当前用户所有，无效行记录在结果中并跳过。
+    """
+    result, public_games = await TemplateTransferService.import_templates(
+        request.stream(), current_user
+    )
+    for game_id in public_games:
+        await TemplateService.invalidate_public_templates(game_id)
+    return result
+
+@router.get("/cache/metrics")
+async def get_template_cache_metrics(
+    current_user: User = Depends(get_current_active_superuser)
+):
+    """获取公共模板列表缓存指标（需要管理员权限）"""
+    return TemplateService.public_cache_metrics()
 
 @router.get("/{template_id}", response_model=TemplateResponse)
 async def get_template(
@@ -63,10 +248,10 @@ async def get_template(
         raise HTTPException(status_code=404, detail="Template not found")
     
     # 检查权限
-    if str(template.owner.id) != str(current_user.id) and not template.is_public:
+    if link_id(template.owner) != str(current_user.id) and not template.is_public:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return template
+    return (await TemplateService.resolve_responses([template]))[0]
 
 @router.put("/{template_id}", response_model=TemplateResponse)
 async def update_template(
@@ -80,9 +265,11 @@ async def update_template(
         raise HTTPException(status_code=404, detail="Template not found")
     
     # 检查权限
-    if str(template.owner.id) != str(current_user.id):
+    if link_id(template.owner) != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    was_public = template.is_public
+    
     # 更新字段
     update_data = template_in.dict(exclude_unset=True)
     for key, value in update_data.items():
@@ -90,7 +277,12 @@ async def update_template(
     
     template.updated_at = datetime.utcnow()
     await template.save()
-    return template
+    template_search_index.upsert(template)
+    if was_public and not template.is_public:
+        await TemplateService.record_tombstone(template, unpublished=True)
+    if was_public or template.is_public:
+        await TemplateService.invalidate_public_templates(link_id(template.game))
+    return (await TemplateService.resolve_responses([template]))[0]
 
 @router.delete("/{template_id}")
 async def delete_template(
@@ -103,10 +295,29 @@ async def delete_template(
         raise HTTPException(status_code=404, detail="Template not found")
     
     # 检查权限
-    if str(template.owner.id) != str(current_user.id):
+    if link_id(template.owner) != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    await TemplateService.record_tombstone(template)
     await template.delete()
+    template_search_index.remove(str(template.id))
+    if template.is_public:
+        await TemplateService.invalidate_public_templates(link_id(template.game))
+    return {"success": True}
+
+@router.post("/{template_id}/use")
+async def use_template(
+    template_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """记录模板使用"""
+    if not is_valid_object_id(template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    if not await TemplateService.can_use_template(template_id, str(current_user.id)):
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    await TemplateService.record_usage(template_id)
     return {"success": True}
 
 @router.get("/game/{package_name}", response_model=List[TemplateResponse])
@@ -119,4 +330,32 @@ async def get_templates_by_game(
         package_name=package_name,
         user_id=str(current_user.id)
     )
-    return templates
\ No newline at end of file
+    return await TemplateService.resolve_responses(templates)
+
+@router.get("/game/{package_name}/bundle")
+async def get_game_template_bundle(
+    package_name: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """获取游戏的预编译公共模板包（每种编码各有强 ETag，可长期缓存）"""
+    game = await game_registry.find_by_package_name(package_name)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    
+    bundle = await TemplateBundleService.get_bundle(game)
+    use_gzip = accepts_encoding(request.headers.get("accept-encoding"), "gzip")
+    etag = bundle.gzip_etag if use_gzip else bundle.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.TEMPLATE_BUNDLE_MAX_AGE_SECONDS}",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=bundle.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=bundle.body, media_type="application/json", headers=headers)
@@ -16,12 +16,95 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 16  # 同时排队/执行的 bcrypt 任务上限
     
     # Discord
     DISCORD_CLIENT_ID: str
     DISCORD_CLIENT_SECRET: str
     DISCORD_REDIRECT_URI: str
     DISCORD_API_BASE: str = "https://discord.com/api/v10"
+    DISCORD_HTTP_POOL_SIZE: int = 100
+    DISCORD_HTTP_POOL_SIZE_PER_HOST: int = 30
+    DISCORD_HTTP_KEEPALIVE_SECONDS: float = 60
+    DISCORD_DNS_CACHE_SECONDS: int = 300
+    DISCORD_HTTP_TIMEOUT_SECONDS: float = 15
+    DISCORD_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    DISCORD_MAX_RETRIES: int = 3
+    DISCORD_MAX_RETRY_AFTER_SECONDS: float = 30  # 超过此等待时间的 429 直接失败
+    DISCORD_RETRY_JITTER_SECONDS: float = 0.25
+    DISCORD_RETRY_BACKOFF_BASE_SECONDS: float = 0.5
+    DISCORD_RETRY_BACKOFF_MAX_SECONDS: float = 8
+    DISCORD_RATE_LIMIT_MAX_BUCKETS: int = 10000
+    DISCORD_GUILD_FETCH_CONCURRENCY: int = 8
+    DISCORD_GUILD_FETCH_DEADLINE_SECONDS: float = 8
+    DISCORD_TOKEN_REFRESH_SKEW_SECONDS: int = 300  # 请求路径中提前刷新的时间
+    DISCORD_TOKEN_SWEEP_AHEAD_SECONDS: int = 900  # 后台刷新即将在此时间内过期的令牌
+    DISCORD_TOKEN_SWEEP_INTERVAL_SECONDS: int = 60
+    DISCORD_TOKEN_SWEEP_BATCH_SIZE: int = 100
+    DISCORD_TOKEN_SWEEP_CONCURRENCY: int = 5
+    DISCORD_TOKEN_SWEEP_FAILURE_BACKOFF_SECONDS: int = 600
+    DISCORD_TOKEN_REFRESH_LEASE_SECONDS: int = 30  # 跨进程刷新同一账号的互斥租约
+    DISCORD_TOKEN_REFRESH_LEASE_POLL_SECONDS: float = 0.5
+    DISCORD_SERVERS_CACHE_TTL_SECONDS: int = 300
+    DISCORD_SERVERS_CACHE_STALE_SECONDS: int = 60 * 60 * 24
+    DISCORD_SERVERS_CACHE_MAX_USERS: int = 10000
+    CHANNEL_ACCESS_FLUSH_INTERVAL_SECONDS: float = 5
+    CHANNEL_ACCESS_BUFFER_MAX_SIZE: int = 10000
+    CHANNEL_CACHE_MAX_SIZE: int = 100000
+    CHANNEL_CACHE_TTL_SECONDS: int = 600
+    
+    # 游戏注册表
+    GAME_REGISTRY_POLL_INTERVAL_SECONDS: int = 30  # 不支持 change stream 时的全量重载间隔
+    # 注册表未命中时查询数据库，数据库中也不存在的键短时间缓存
+    GAME_REGISTRY_MISS_TTL_SECONDS: float = 5
+    GAME_REGISTRY_MISS_CACHE_SIZE: int = 10000
+    GAME_RESOLVE_MAX_NAMES: int = 500
+    GAME_BULK_UPSERT_MAX_ROWS: int = 10000
+    GAME_CONTEXT_FLUSH_INTERVAL_SECONDS: float = 2
+    GAME_CONTEXT_BUFFER_MAX_GAMES: int = 10000
+    GAME_CONTEXT_MAX_PENDING_PER_GAME: int = 100
+    GAME_CONTEXT_TOP_K: int = 50  # 写入 Game.reported_contexts 的上下文数量
+    GAME_CONTEXT_SKETCH_WIDTH: int = 2048
+    GAME_CONTEXT_SKETCH_DEPTH: int = 4
+    GAME_CONTEXT_TOP_BATCH_SIZE: int = 100  # 每次查询投影候选单元的游戏数，限制投影大小
+    GAME_IDENTIFY_MIN_PATTERN_LENGTH: int = 3  # 过短的上下文几乎匹配所有输入
+    GAME_IDENTIFY_REBUILD_DELAY_SECONDS: float = 1
+    GAME_IDENTIFY_MAX_RESULTS: int = 20
+    
+    # 模板
+    TEMPLATE_USAGE_AGGREGATION_ENABLED: bool = True  # 关闭时每次使用直接 $inc
+    TEMPLATE_USAGE_FLUSH_INTERVAL_SECONDS: float = 5
+    TEMPLATE_USAGE_BUFFER_MAX_SIZE: int = 10000
+    TEMPLATE_TRENDING_WINDOW_DAYS: int = 14
+    TEMPLATE_TRENDING_HALF_LIFE_HOURS: float = 48
+    TEMPLATE_TRENDING_INTERVAL_SECONDS: int = 15 * 60
+    TEMPLATE_TRENDING_BATCH_SIZE: int = 1000
+    TEMPLATE_LIST_CACHE_TTL_SECONDS: int = 60
+    TEMPLATE_LIST_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TEMPLATE_LIST_VERSION_TTL_SECONDS: float = 1  # 其他进程的变更最多这么久后可见
+    TEMPLATE_SEARCH_MAX_PREFIX_LENGTH: int = 20
+    # 超过该大小的倒排表在重建时按使用次数排序，搜索时顺序扫描并提前结束
+    TEMPLATE_SEARCH_RANKED_MIN_POSTINGS: int = 1000
+    TEMPLATE_SEARCH_MAX_SCAN: int = 20000
+    # 多取候选，向数据库确认可见性后再截取
+    TEMPLATE_SEARCH_OVERFETCH_FACTOR: int = 2
+    TEMPLATE_SEARCH_REBUILD_INTERVAL_SECONDS: int = 60 * 60
+    TEMPLATE_BUNDLE_SIZE: int = 200
+    TEMPLATE_BUNDLE_REFRESH_SECONDS: int = 10 * 60  # 使用次数排序的自然漂移
+    TEMPLATE_BUNDLE_STALE_SECONDS: int = 60 * 60 * 24
+    TEMPLATE_BUNDLE_CACHE_MAX_GAMES: int = 5000
+    TEMPLATE_BUNDLE_MAX_AGE_SECONDS: int = 60 * 60
+    TEMPLATE_TRANSFER_BATCH_SIZE: int = 500
+    TEMPLATE_IMPORT_MAX_LINE_BYTES: int = 64 * 1024
+    TEMPLATE_IMPORT_MAX_ERRORS: int = 100
+    TEMPLATE_SYNC_PAGE_SIZE: int = 500
+    TEMPLATE_SYNC_LAG_SECONDS: float = 5  # 水位线落后当前时间，避免漏掉尚未提交的写入
+    TEMPLATE_TOMBSTONE_RETENTION_DAYS: int = 30
+    
+    # 身份缓存
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
     
     class Config:
         env_file = ".env"
@@ -1,22 +1,77 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from beanie import init_beanie
+from bson import DBRef
 
 from app.core.config import settings
 from app.models.user import User
-from app.models.template import Template
-from app.models.game import Game
-from app.models.discord import DiscordServer, DiscordChannel
+from app.models.template import Template, TemplateListVersion, TemplateTombstone, TemplateUsageDaily
+from app.models.game import Game, GameContextStats
+from app.models.lease import Lease
+from app.models.discord import DiscordServer, DiscordChannel, DiscordChannelAccess
+from app.utils.logger import log_warning
+
+async def dedupe_games(database: AsyncIOMotorDatabase) -> int:
+    """
+    合并 package_name 重复的游戏，返回删除的文档数
+    
+    init_beanie 会为 package_name 创建唯一索引，已有重复数据时建索引失败，
+    因此启动时先执行本步骤（唯一索引已存在时跳过）。每组保留最早创建的一条，
+    合并 input_contexts，把引用其余文档的模板改指向保留的游戏后删除其余文档。
+    多个进程同时执行时结果相同。
+    """
+    games = database[Game.Settings.name]
+    for index in (await games.index_information()).values():
+        if index.get("unique") and index["key"] == [("package_name", 1)]:
+            return 0
+    
+    removed = 0
+    async for group in games.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": "$package_name",
+            "ids": {"$push": "$_id"},
+            "contexts": {"$push": "$input_contexts"},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        keep, *duplicates = group["ids"]
+        contexts = list(dict.fromkeys(
+            context for contexts in group["contexts"] for context in contexts or []
+        ))
+        await games.update_one({"_id": keep}, {"$set": {"input_contexts": contexts}})
+        # 更新 updated_at 让增量同步的客户端拿到新的游戏 ID
+        await database[Template.Settings.name].update_many(
+            {"game.$id": {"$in": duplicates}},
+            {"$set": {"game": DBRef(Game.Settings.name, keep), "updated_at": datetime.utcnow()}}
+        )
+        result = await games.delete_many({"_id": {"$in": duplicates}})
+        removed += result.deleted_count
+        log_warning(
+            f"Merged {len(duplicates)} duplicate games into {keep}",
+            {"package_name": group["_id"]}
+        )
+    return removed
 
 async def init_db():
     """初始化数据库连接"""
     client = AsyncIOMotorClient(settings.MONGODB_URL)
+    database = client[settings.MONGODB_DB_NAME]
+    await dedupe_games(database)
     await init_beanie(
-        database=client[settings.MONGODB_DB_NAME],
+        database=database,
         document_models=[
             User,
             Template,
+            TemplateTombstone,
+            TemplateUsageDaily,
+            TemplateListVersion,
             Game,
+            GameContextStats,
             DiscordServer,
             DiscordChannel,
+            DiscordChannelAccess,
+            Lease,
         ]
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,51 @@
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.models.user import User
+from app.utils.cache import TTLCache
+
+
+class PrincipalCache:
+    """
+    已验证身份的缓存：以访问令牌为键，跳过重复的 JWT 解码和用户查询
+
+    缓存仅在当前进程内有效，多 worker 部署时其他进程依靠 TTL 收敛。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, token: str) -> Optional[User]:
+        """
+        获取令牌对应的用户副本，避免请求之间共享可变对象
+        """
+        user = self._cache.get(token)
+        if user is None:
+            return None
+        return user.copy(deep=True)
+
+    def set(self, token: str, user: User, token_exp: Optional[int] = None) -> None:
+        """
+        缓存用户，过期时间不超过令牌本身的有效期
+        """
+        ttl = self._cache.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        self._cache.set(token, user.copy(deep=True), ttl=ttl)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """
+        使某个用户的所有缓存令牌失效
+        """
+        user_id = str(user_id)
+        self._cache.discard_where(lambda _, user: str(user.id) == user_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
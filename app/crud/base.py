@@ -2,6 +2,8 @@ from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
 from beanie import Document
 from pydantic import BaseModel
 
+from app.utils.pagination import decode_cursor, keyset_filter
+
 ModelType = TypeVar("ModelType", bound=Document)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
@@ -20,12 +22,18 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return await self.model.get(id)
 
     async def get_multi(
-        self, *, skip: int = 0, limit: int = 100
+        self, *, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
     ) -> List[ModelType]:
         """
-        获取多个对象
+        获取多个对象，按 _id 排序；提供 cursor 时使用键集分页并忽略 skip
         """
-        return await self.model.find().skip(skip).limit(limit).to_list()
+        query = self.model.find()
+        if cursor:
+            (last_id,) = decode_cursor(cursor)
+            query = query.find(keyset_filter(None, None, last_id, descending=False))
+        else:
+            query = query.skip(skip)
+        return await query.sort("+_id").limit(limit).to_list()
 
     async def create(self, *, obj_in: CreateSchemaType) -> ModelType:
         """
@@ -1,13 +1,96 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Any, Dict, Optional, List, Tuple, Union
+from pymongo import UpdateOne
 from app.crud.base import CRUDBase
 from app.models.game import Game
 from app.schemas.game import GameCreate, GameUpdate
+from app.services.game_registry import game_registry
 
 class CRUDGame(CRUDBase[Game, GameCreate, GameUpdate]):
     async def get_by_package_name(self, *, package_name: str) -> Optional[Game]:
-        return await Game.find_one(Game.package_name == package_name)
+        """通过注册表按包名查找，返回副本以免调用方修改共享对象"""
+        found = await game_registry.find_by_package_name(package_name)
+        return found.copy(deep=True) if found else None
+
+    async def get_by_package_names(self, *, package_names: List[str]) -> Dict[str, Game]:
+        """批量按包名查找，返回找到的游戏（副本）；注册表未加载时用一次 $in 查询"""
+        if game_registry.ready:
+            found = {
+                name: game_registry.get_by_package_name(name) for name in set(package_names)
+            }
+            return {name: g.copy(deep=True) for name, g in found.items() if g is not None}
+        games = await Game.find({"package_name": {"$in": list(set(package_names))}}).to_list()
+        return {g.package_name: g for g in games}
+
+    async def bulk_upsert(self, *, objs_in: List[GameCreate]) -> Tuple[int, int, int]:
+        """
+        按包名批量插入或更新游戏，返回 (新增, 修改, 未变化) 数量
+
+        同一包名出现多次时以最后一行为准；请求中未显式提供的字段只在新建时写入默认值。
+        使用聚合管道更新：字段值都未变化时不改动 updated_at，文档保持不变，
+        不会计入修改数，也不会触发注册表重载和识别器重建。
+        """
+        rows = {obj_in.package_name: obj_in for obj_in in objs_in}
+        now = datetime.utcnow()
+        operations = []
+        for package_name, obj_in in rows.items():
+            update_data = obj_in.dict(exclude_unset=True)
+            update_data.pop("package_name")
+            defaults = {
+                field: value
+                for field, value in obj_in.dict().items()
+                if field not in update_data and field != "package_name"
+            }
+            # 管道中字段缺失的文档即本次 upsert 新建的文档
+            is_new = {"$eq": [{"$type": "$created_at"}, "missing"]}
+            changed = {"$or": [
+                {"$ne": [f"${field}", {"$literal": value}]}
+                for field, value in update_data.items()
+            ] or [False]}
+            operations.append(UpdateOne(
+                {"package_name": package_name},
+                [{"$set": {
+                    **{field: {"$literal": value} for field, value in update_data.items()},
+                    **{
+                        field: {"$cond": [is_new, {"$literal": value}, f"${field}"]}
+                        for field, value in defaults.items()
+                    },
+                    "created_at": {"$cond": [is_new, now, "$created_at"]},
+                    "updated_at": {"$cond": [{"$or": [is_new, changed]}, now, "$updated_at"]},
+                }}],
+                upsert=True
+            ))
+        if not operations:
+            return 0, 0, 0
+        result = await Game.get_motor_collection().bulk_write(operations, ordered=False)
+        inserted = result.upserted_count
+        if inserted or result.modified_count:
+            # 本进程立即可见，其他进程依靠 change stream 或轮询
+            await game_registry.load()
+        return inserted, result.modified_count, len(operations) - inserted - result.modified_count
 
     async def get_all(self) -> List[Game]:
         return await Game.find().to_list()
 
-game = CRUDGame(Game)
\ No newline at end of file
+    async def create(self, *, obj_in: GameCreate) -> Game:
+        db_obj = await super().create(obj_in=obj_in)
+        game_registry.put(db_obj.copy(deep=True))
+        return db_obj
+
+    async def update(
+        self,
+        *,
+        db_obj: Game,
+        obj_in: Union[GameUpdate, Dict[str, Any]]
+    ) -> Game:
+        db_obj.updated_at = datetime.utcnow()
+        db_obj = await super().update(db_obj=db_obj, obj_in=obj_in)
+        game_registry.put(db_obj.copy(deep=True))
+        return db_obj
+
+    async def remove(self, *, id: str) -> Optional[Game]:
+        db_obj = await super().remove(id=id)
+        game_registry.remove(id)
+        return db_obj
+
+game = CRUDGame(Game)
@@ -1,5 +1,6 @@
 from typing import Any, Dict, Optional, Union
-from app.core.security import get_password_hash, verify_password
+from app.core.principal_cache import principal_cache
+from app.core.security import password_hasher
 from app.crud.base import CRUDBase
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
@@ -11,7 +12,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     async def create(self, *, obj_in: UserCreate) -> User:
         db_obj = User(
             email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
+            hashed_password=await password_hasher.hash(obj_in.password),
             full_name=obj_in.full_name,
             is_active=obj_in.is_active,
             is_superuser=False,
@@ -28,17 +29,19 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             update_data = obj_in.dict(exclude_unset=True)
         
         if update_data.get("password"):
-            hashed_password = get_password_hash(update_data["password"])
+            hashed_password = await password_hasher.hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
         
-        return await super().update(db_obj=db_obj, obj_in=update_data)
+        updated_user = await super().update(db_obj=db_obj, obj_in=update_data)
+        principal_cache.invalidate_user(str(updated_user.id))
+        return updated_user
 
     async def authenticate(self, *, email: str, password: str) -> Optional[User]:
         user = await self.get_by_email(email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await password_hasher.verify(password, user.hashed_password):
             return None
         return user
 
@@ -3,6 +3,16 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.database import init_db
+from app.core.security import password_hasher
+from app.services.channel_access import channel_access_buffer
+from app.services.discord_client import discord_client
+from app.services.discord_token_manager import discord_token_manager
+from app.services.game_contexts import game_context_buffer
+from app.services.game_identifier import game_identifier
+from app.services.game_registry import game_registry
+from app.services.template_search import template_search_index
+from app.services.template_trending import template_trending_scorer
+from app.services.template_usage import template_daily_usage_buffer, template_usage_buffer
 from app.api.endpoints import auth, templates, games, discord
 from app.core.middleware import LoggingMiddleware
 
@@ -33,6 +43,30 @@ app.include_router(discord.router, prefix=settings.API_V1_STR)
 @app.on_event("startup")
 async def startup():
     await init_db()
+    await game_registry.start()
+    await discord_client.start()
+    discord_token_manager.start()
+    channel_access_buffer.start()
+    game_context_buffer.start()
+    template_usage_buffer.start()
+    template_daily_usage_buffer.start()
+    template_search_index.start()
+    template_trending_scorer.start()
+
+# 关闭事件
+@app.on_event("shutdown")
+async def shutdown():
+    await template_trending_scorer.stop()
+    await template_search_index.stop()
+    await template_daily_usage_buffer.stop()
+    await template_usage_buffer.stop()
+    await game_context_buffer.stop()
+    await channel_access_buffer.stop()
+    await discord_token_manager.stop()
+    await discord_client.close()
+    await game_registry.stop()
+    await game_identifier.stop()
+    password_hasher.shutdown()
 
 @app.get("/")
 async def root():
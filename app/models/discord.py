@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import List, Optional
 from beanie import Document
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 class DiscordAccount(Document):
     discord_id: str
@@ -11,6 +12,7 @@ class DiscordAccount(Document):
     access_token: str
     refresh_token: str
     token_expires_at: datetime
+    refresh_lease_until: Optional[datetime] = None  # 正在刷新令牌的进程持有的租约
     
     class Settings:
         name = "discord_accounts"
@@ -44,4 +46,26 @@ class DiscordServer(Document):
         name = "discord_servers"
         indexes = [
             "server_id",
-        ]
\ No newline at end of file
+        ]
+
+class DiscordChannelAccess(Document):
+    """用户访问过的频道（每个用户每个频道一条记录）"""
+    user_id: str
+    channel_id: str
+    server_id: str
+    name: str
+    type: str
+    position: int = 0
+    deep_link: str
+    last_accessed: datetime
+    
+    class Settings:
+        name = "discord_channel_access"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("channel_id", ASCENDING)],
+                unique=True,
+            ),
+            # 支持按用户取最近访问的前 K 个频道
+            IndexModel([("user_id", ASCENDING), ("last_accessed", DESCENDING)]),
+        ]
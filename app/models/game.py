@@ -1,19 +1,40 @@
 from beanie import Document
-from typing import Optional, List
-from pydantic import Field
+from typing import Dict, Optional, List
+from pydantic import BaseModel, Field
 from datetime import datetime
+from pymongo import IndexModel
 
 class Game(Document):
     name: str
     package_name: str  # Android 包名，用于识别
     icon_url: Optional[str] = None
     description: Optional[str] = None
-    input_contexts: List[str] = []  # 匹配输入框的上下文特征
+    input_contexts: List[str] = []  # 匹配输入框的上下文特征（人工维护）
+    reported_contexts: List[str] = []  # 由上报统计得出的高频上下文，仅 GameContextBuffer 写入
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
     class Settings:
         name = "games"
         indexes = [
-            "package_name",
-        ]
\ No newline at end of file
+            # 唯一索引保证并发 upsert 不会创建重复的游戏
+            IndexModel([("package_name", 1)], unique=True),
+        ]
+
+class ContextCount(BaseModel):
+    context: str
+    count: int = 0
+
+class GameContextStats(Document):
+    """游戏输入上下文的频率统计：Count-Min Sketch 计数器和估计频率最高的 top-K"""
+    package_name: str
+    total: int = 0
+    cms: Dict[str, int] = {}  # 稀疏计数器，键为 "行_列"
+    top: List[ContextCount] = []
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "game_context_stats"
+        indexes = [
+            IndexModel([("package_name", 1)], unique=True),
+        ]
@@ -0,0 +1,15 @@
+from datetime import datetime
+from beanie import Document
+from pymongo import IndexModel
+
+class Lease(Document):
+    """跨进程的命名租约，用于在多个 worker 中选出唯一执行者"""
+    name: str
+    owner: str
+    expires_at: datetime
+    
+    class Settings:
+        name = "leases"
+        indexes = [
+            IndexModel([("name", 1)], unique=True),
+        ]
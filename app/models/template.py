@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import Optional, List
 from beanie import Document, Link
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.core.config import settings
 from app.models.user import User
 from app.models.game import Game
 
@@ -12,6 +14,8 @@ class Template(Document):
     game: Optional[Link[Game]] = None
     owner: Link[User]
     usage_count: int = 0
+    trending_score: float = 0  # 由后台任务根据按天使用次数计算
+    trending_run_at: Optional[datetime] = None  # 最近一次计算出分数的时间，用于清零未出现的模板
     is_public: bool = False
     tags: List[str] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -19,10 +23,85 @@ class Template(Document):
     
     class Settings:
         name = "templates"
+        # 复合索引按 TemplateService 的查询设计：等值条件在前，排序字段在后
         indexes = [
-            "owner",
-            "game",
-            "category",
+            # 用户模板列表：owner [+ game] [+ category]，按 updated_at 倒序
+            IndexModel([("owner.$id", 1), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("owner.$id", 1), ("game.$id", 1), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("owner.$id", 1), ("category", 1), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("owner.$id", 1), ("game.$id", 1), ("category", 1), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+            # 游戏模板合并排名中用户自己的部分：owner + game，按 usage_count 倒序
+            IndexModel([("owner.$id", 1), ("game.$id", 1), ("usage_count", DESCENDING), ("_id", DESCENDING)]),
+            # 公共模板列表：is_public [+ game] [+ category]，按 usage_count 倒序
+            IndexModel([("is_public", 1), ("usage_count", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("game.$id", 1), ("usage_count", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("category", 1), ("usage_count", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("game.$id", 1), ("category", 1), ("usage_count", DESCENDING), ("_id", DESCENDING)]),
+            # 增量同步：公共模板 [+ game]，按 updated_at 范围查询（用户自己的部分复用上面的索引）
+            IndexModel([("is_public", 1), ("updated_at", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("is_public", 1), ("game.$id", 1), ("updated_at", ASCENDING), ("_id", ASCENDING)]),
+            # 热门排序：is_public [+ game] [+ category]，按 trending_score 倒序
+            IndexModel([("is_public", 1), ("trending_score", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("game.$id", 1), ("trending_score", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("category", 1), ("trending_score", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_public", 1), ("game.$id", 1), ("category", 1), ("trending_score", DESCENDING), ("_id", DESCENDING)]),
+            # 只包含有热门分数的模板，后台任务据此找出需要清零的模板
+            IndexModel(
+                [("trending_score", DESCENDING)],
+                name="trending_score_active",
+                partialFilterExpression={"trending_score": {"$gt": 0}},
+            ),
             "tags",
-            "is_public",
-        ]
\ No newline at end of file
+        ]
+
+class TemplateTombstone(Document):
+    """已删除（或对其他用户取消公开）的模板记录，供客户端增量同步"""
+    template_id: str
+    owner_id: str
+    game_id: Optional[str] = None
+    was_public: bool = False
+    unpublished: bool = False  # True 表示模板仍存在，只是不再公开
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "template_tombstones"
+        indexes = [
+            IndexModel([("owner_id", ASCENDING), ("deleted_at", ASCENDING)]),
+            IndexModel([("was_public", ASCENDING), ("game_id", ASCENDING), ("deleted_at", ASCENDING)]),
+            IndexModel([("was_public", ASCENDING), ("deleted_at", ASCENDING)]),
+            # 超过保留期的墓碑自动删除，更早的水位线需要客户端全量同步
+            IndexModel(
+                [("deleted_at", ASCENDING)],
+                name="deleted_at_ttl",
+                expireAfterSeconds=settings.TEMPLATE_TOMBSTONE_RETENTION_DAYS * 24 * 60 * 60,
+            ),
+        ]
+
+class TemplateUsageDaily(Document):
+    """模板按天（UTC）汇总的使用次数，用于计算热门分数"""
+    template_id: str
+    day: datetime
+    count: int = 0
+    
+    class Settings:
+        name = "template_usage_daily"
+        indexes = [
+            IndexModel([("template_id", ASCENDING), ("day", ASCENDING)], unique=True),
+            # 超出热门窗口的桶自动删除
+            IndexModel(
+                [("day", ASCENDING)],
+                name="day_ttl",
+                expireAfterSeconds=(settings.TEMPLATE_TRENDING_WINDOW_DAYS + 1) * 24 * 60 * 60,
+            ),
+        ]
+
+class TemplateListVersion(Document):
+    """公共模板列表的版本号（每个游戏一条，key 为游戏 ID，"*" 表示全部游戏），各进程据此使列表缓存失效"""
+    key: str
+    version: int = 0
+    
+    class Settings:
+        name = "template_list_versions"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+        ]
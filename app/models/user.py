@@ -18,4 +18,5 @@ class User(Document):
         name = "users"
         indexes = [
             "email",
+            "discord_account.token_expires_at",
         ]
\ No newline at end of file
@@ -31,7 +31,7 @@ class DiscordChannelCreate(DiscordChannelBase):
     pass
 
 class DiscordChannelResponse(DiscordChannelBase):
-    id: str
+    id: Optional[str] = None
     last_accessed: Optional[datetime] = None
     
     class Config:
@@ -46,8 +46,9 @@ class DiscordServerCreate(DiscordServerBase):
     channels: List[DiscordChannelCreate] = []
 
 class DiscordServerResponse(DiscordServerBase):
-    id: str
+    id: Optional[str] = None
     channels: List[DiscordChannelResponse] = []
+    error: Optional[str] = None  # 获取频道失败或超时时的错误信息
     
     class Config:
         orm_mode = True
\ No newline at end of file
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class GameBase(BaseModel):
@@ -20,8 +20,22 @@ class GameUpdate(BaseModel):
 
 class GameResponse(GameBase):
     id: str
+    reported_contexts: List[str] = []
     created_at: datetime
     updated_at: datetime
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class GameCandidate(BaseModel):
+    game: GameResponse
+    score: float
+    matched_contexts: List[str] = []
+
+class GameResolveRequest(BaseModel):
+    package_names: List[str] = Field(..., min_items=1)
+
+class GameBulkUpsertResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
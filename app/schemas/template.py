@@ -29,4 +29,31 @@ class TemplateResponse(TemplateBase):
     updated_at: datetime
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TemplateSuggestion(BaseModel):
+    id: str
+    title: str
+    category: str
+    game_id: Optional[str] = None
+    usage_count: int
+
+class TemplateSyncResponse(BaseModel):
+    templates: List[TemplateResponse] = []
+    deleted: List[str] = []
+    watermark: datetime  # 同步已完成到的时间点
+    cursor: str  # 下次同步时作为 cursor 传回
+    has_more: bool = False
+
+class TemplateImportRecord(TemplateCreate):
+    """NDJSON 导入的单行记录，游戏可以用 ID 或包名指定"""
+    game_package_name: Optional[str] = None
+
+class TemplateImportError(BaseModel):
+    line: int
+    error: str
+
+class TemplateImportResult(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: List[TemplateImportError] = []  # 最多返回 TEMPLATE_IMPORT_MAX_ERRORS 条
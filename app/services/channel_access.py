@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateMany, UpdateOne
+
+from app.core.config import settings
+from app.models.discord import DiscordChannel, DiscordChannelAccess
+from app.services.write_behind import WriteBehindBuffer
+from app.utils.cache import TTLCache
+from app.utils.logger import log_error
+
+# 频道元数据很少变化，访问记录只需要其中几个字段，避免每次访问都查询数据库
+_channel_cache = TTLCache(
+    maxsize=settings.CHANNEL_CACHE_MAX_SIZE,
+    ttl=settings.CHANNEL_CACHE_TTL_SECONDS,
+)
+
+class ChannelAccessBuffer(WriteBehindBuffer):
+    """
+    频道访问记录的写缓冲
+    
+    按 (用户, 频道) 合并访问，只保留最近一次访问时间，
+    刷新时 upsert 到每个用户的访问记录集合，并以 $max 更新 DiscordChannel.last_accessed。
+    """
+    
+    def _merge(
+        self,
+        old: Tuple[datetime, Dict[str, Any]],
+        new: Tuple[datetime, Dict[str, Any]]
+    ) -> Tuple[datetime, Dict[str, Any]]:
+        return (max(old[0], new[0]), new[1])
+    
+    def _collection(self) -> AsyncIOMotorCollection:
+        return DiscordChannelAccess.get_motor_collection()
+    
+    def _build_operations(self, items: Dict[Hashable, Any]) -> List[UpdateOne]:
+        return [
+            UpdateOne(
+                {"user_id": user_id, "channel_id": channel_id},
+                {
+                    "$max": {"last_accessed": accessed_at},
+                    "$set": channel_fields,
+                },
+                upsert=True
+            )
+            for (user_id, channel_id), (accessed_at, channel_fields) in items.items()
+        ]
+    
+    async def _write(self, items: Dict[Hashable, Any]) -> List[Hashable]:
+        retry = await super()._write(items)
+        # 频道的最近访问时间是派生数据，失败时只记录日志，不让访问记录重试
+        failed = set(retry)
+        latest: Dict[str, datetime] = {}
+        for key, (accessed_at, _) in items.items():
+            if key not in failed:
+                channel_id = key[1]
+                latest[channel_id] = max(accessed_at, latest.get(channel_id, accessed_at))
+        if latest:
+            try:
+                await DiscordChannel.get_motor_collection().bulk_write([
+                    UpdateMany({"channel_id": channel_id}, {"$max": {"last_accessed": accessed_at}})
+                    for channel_id, accessed_at in latest.items()
+                ], ordered=False)
+            except Exception:
+                log_error("Discord channel last_accessed update failed", exc_info=True)
+        return retry
+    
+    @staticmethod
+    async def find_channel(channel_id: str) -> Optional[DiscordChannel]:
+        """按频道 ID 查找频道（带缓存），返回副本以免调用方修改共享对象"""
+        channel = _channel_cache.get(channel_id)
+        if channel is None:
+            channel = await DiscordChannel.find_one(DiscordChannel.channel_id == channel_id)
+            if channel is None:
+                return None
+            _channel_cache.set(channel_id, channel)
+        return channel.copy()
+    
+    async def record(self, user_id: str, channel: DiscordChannel, accessed_at: datetime) -> None:
+        """记录用户的一次频道访问（缓冲区已满时直接写入）"""
+        channel_fields = {
+            "server_id": channel.server_id,
+            "name": channel.name,
+            "type": channel.type,
+            "position": channel.position,
+            "deep_link": channel.deep_link,
+        }
+        await self.add_or_write((user_id, channel.channel_id), (accessed_at, channel_fields))
+
+channel_access_buffer = ChannelAccessBuffer(
+    flush_interval=settings.CHANNEL_ACCESS_FLUSH_INTERVAL_SECONDS,
+    max_size=settings.CHANNEL_ACCESS_BUFFER_MAX_SIZE,
+)
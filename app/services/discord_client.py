@@ -1,104 +1,186 @@
+import asyncio
+import json
 import aiohttp
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.core.config import settings
 from app.models.discord import DiscordAccount, DiscordServer, DiscordChannel
+from app.services.discord_ratelimit import DiscordRateLimiter
+
+class DiscordAPIError(Exception):
+    """Discord API 请求失败"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
 
 class DiscordClient:
     """Discord API 客户端服务"""
     
-    @staticmethod
-    async def exchange_code(code: str) -> Dict:
-        """使用授权码交换访问令牌"""
-        async with aiohttp.ClientSession() as session:
-            data = {
-                'client_id': settings.DISCORD_CLIENT_ID,
-                'client_secret': settings.DISCORD_CLIENT_SECRET,
-                'grant_type': 'authorization_code',
-                'code': code,
-                'redirect_uri': settings.DISCORD_REDIRECT_URI,
-            }
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    def __init__(
+        self,
+        base_url: str = settings.DISCORD_API_BASE,
+        session: Optional[aiohttp.ClientSession] = None,
+        rate_limiter: Optional[DiscordRateLimiter] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.rate_limiter = rate_limiter or DiscordRateLimiter()
+        self._session = session
+        # 外部注入的会话由调用方负责关闭
+        self._owns_session = session is None
+    
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池、keep-alive 和 DNS 缓存的会话"""
+        connector = aiohttp.TCPConnector(
+            limit=settings.DISCORD_HTTP_POOL_SIZE,
+            limit_per_host=settings.DISCORD_HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.DISCORD_HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=settings.DISCORD_DNS_CACHE_SECONDS,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.DISCORD_HTTP_TIMEOUT_SECONDS,
+            connect=settings.DISCORD_HTTP_CONNECT_TIMEOUT_SECONDS,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+    
+    async def start(self) -> None:
+        """创建共享会话（应用启动时调用）"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            self._owns_session = True
+    
+    async def close(self) -> None:
+        """关闭共享会话（应用关闭时调用）"""
+        if self._session is not None and self._owns_session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._owns_session = True
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        error_message: str,
+        **kwargs: Any
+    ) -> Any:
+        """
+        发送请求并返回 JSON 响应
+        
+        请求经过速率限制调度器排队；429 按 retry_after 等待后重试，
+        幂等请求遇到 5xx 时按指数退避重试。
+        """
+        session = await self._get_session()
+        route, major = self.rate_limiter.route(method, path)
+        token_id = self.rate_limiter.token_id(
+            (kwargs.get("headers") or {}).get("Authorization")
+        )
+        retry_5xx = method == "GET"
+        
+        for attempt in range(settings.DISCORD_MAX_RETRIES + 1):
+            can_retry = attempt < settings.DISCORD_MAX_RETRIES
+            await self.rate_limiter.acquire(route, major, token_id)
             
-            async with session.post(
-                f"{settings.DISCORD_API_BASE}/oauth2/token",
-                data=data,
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to exchange code: {error_text}")
-                return await response.json()
+            async with session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                self.rate_limiter.update(route, major, token_id, response.headers)
+                if response.status == 200:
+                    return await response.json()
+                
+                status = response.status
+                error_text = await response.text()
+                if status == 429:
+                    retry_after, is_global = self._parse_rate_limit(response, error_text)
+                    self.rate_limiter.on_rate_limited(route, major, token_id, retry_after, is_global)
+            
+            if status == 429 and can_retry and retry_after <= settings.DISCORD_MAX_RETRY_AFTER_SECONDS:
+                # 下一次 acquire 会等待到桶或全局限制重置
+                self.rate_limiter.retries_total += 1
+                continue
+            if status >= 500 and retry_5xx and can_retry:
+                self.rate_limiter.retries_total += 1
+                await asyncio.sleep(self.rate_limiter.backoff_delay(attempt))
+                continue
+            raise DiscordAPIError(status, f"{error_message}: {error_text}")
     
     @staticmethod
-    async def get_user_info(access_token: str) -> Dict:
+    def _parse_rate_limit(response: aiohttp.ClientResponse, body: str) -> Tuple[float, bool]:
+        """解析 429 响应中的 retry_after 和全局限制标记"""
+        retry_after = 1.0
+        is_global = response.headers.get("X-RateLimit-Global", "").lower() == "true"
+        try:
+            retry_after = float(response.headers.get("Retry-After", retry_after))
+            data = json.loads(body)
+            retry_after = float(data.get("retry_after", retry_after))
+            is_global = is_global or bool(data.get("global", False))
+        except (ValueError, AttributeError):
+            pass
+        return retry_after, is_global
+    
+    def metrics(self) -> Dict[str, float]:
+        """速率限制调度器指标"""
+        return self.rate_limiter.metrics()
+    
+    async def exchange_code(self, code: str) -> Dict:
+        """使用授权码交换访问令牌"""
+        data = {
+            'client_id': settings.DISCORD_CLIENT_ID,
+            'client_secret': settings.DISCORD_CLIENT_SECRET,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': settings.DISCORD_REDIRECT_URI,
+        }
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        return await self._request(
+            "POST", "/oauth2/token", "Failed to exchange code",
+            data=data, headers=headers
+        )
+    
+    async def get_user_info(self, access_token: str) -> Dict:
         """获取 Discord 用户信息"""
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            async with session.get(
-                f"{settings.DISCORD_API_BASE}/users/@me",
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to get user info: {error_text}")
-                return await response.json()
+        headers = {'Authorization': f'Bearer {access_token}'}
+        return await self._request(
+            "GET", "/users/@me", "Failed to get user info", headers=headers
+        )
     
-    @staticmethod
-    async def get_user_guilds(access_token: str) -> List[Dict]:
+    async def get_user_guilds(self, access_token: str) -> List[Dict]:
         """获取用户所在的服务器"""
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            async with session.get(
-                f"{settings.DISCORD_API_BASE}/users/@me/guilds",
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to get user guilds: {error_text}")
-                return await response.json()
+        headers = {'Authorization': f'Bearer {access_token}'}
+        return await self._request(
+            "GET", "/users/@me/guilds", "Failed to get user guilds", headers=headers
+        )
     
-    @staticmethod
-    async def get_guild_channels(access_token: str, guild_id: str) -> List[Dict]:
+    async def get_guild_channels(self, access_token: str, guild_id: str) -> List[Dict]:
         """获取服务器频道"""
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            async with session.get(
-                f"{settings.DISCORD_API_BASE}/guilds/{guild_id}/channels",
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to get guild channels: {error_text}")
-                return await response.json()
+        headers = {'Authorization': f'Bearer {access_token}'}
+        return await self._request(
+            "GET", f"/guilds/{guild_id}/channels", "Failed to get guild channels",
+            headers=headers
+        )
     
     @staticmethod
     def create_deep_link(server_id: str, channel_id: str) -> str:
         """创建 Discord 深度链接"""
         return f"discord://discord.com/channels/{server_id}/{channel_id}"
     
-    @staticmethod
-    async def refresh_discord_token(refresh_token: str) -> Dict:
+    async def refresh_discord_token(self, refresh_token: str) -> Dict:
         """刷新 Discord 访问令牌"""
-        async with aiohttp.ClientSession() as session:
-            data = {
-                'client_id': settings.DISCORD_CLIENT_ID,
-                'client_secret': settings.DISCORD_CLIENT_SECRET,
-                'grant_type': 'refresh_token',
-                'refresh_token': refresh_token,
-            }
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            
-            async with session.post(
-                f"{settings.DISCORD_API_BASE}/oauth2/token",
-                data=data,
-                headers=headers
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to refresh token: {error_text}")
-                return await response.json()
\ No newline at end of file
+        data = {
+            'client_id': settings.DISCORD_CLIENT_ID,
+            'client_secret': settings.DISCORD_CLIENT_SECRET,
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+        }
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        return await self._request(
+            "POST", "/oauth2/token", "Failed to refresh token",
+            data=data, headers=headers
+        )
+
+# 全局共享客户端，在应用启动/关闭时管理会话生命周期
+discord_client = DiscordClient()
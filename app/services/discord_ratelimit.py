@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+from app.core.config import settings
+
+# 路径中的 snowflake ID；紧跟在这些资源后的 ID 是 Discord 的主参数，各自拥有独立的桶
+_SNOWFLAKE_RE = re.compile(r"/(\d{15,25})(?=/|$)")
+_MAJOR_RESOURCES = ("channels", "guilds", "webhooks")
+
+BucketKey = Tuple[str, str, str]
+
+class RateLimitBucket:
+    """单个 Discord 速率限制桶的状态"""
+    
+    def __init__(self):
+        self.limit = 1
+        self.remaining = 1
+        self.reset_at = 0.0  # time.monotonic() 时间
+        self.lock = asyncio.Lock()
+
+class DiscordRateLimiter:
+    """
+    Discord 速率限制调度器
+    
+    按 (X-RateLimit-Bucket 或路由模板, 主参数, 访问令牌) 跟踪速率限制桶，
+    并按访问令牌跟踪全局限制；额度耗尽时请求在桶上排队等待重置，而不是直接失败。
+    """
+    
+    def __init__(self, max_buckets: int = settings.DISCORD_RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[BucketKey, RateLimitBucket] = {}
+        # 路由模板 -> X-RateLimit-Bucket（同一模板的不同主参数共享桶哈希）
+        self._bucket_hashes: Dict[str, str] = {}
+        # 访问令牌 -> 全局限制重置时间
+        self._global_reset_at: Dict[str, float] = {}
+        
+        # 指标
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.rate_limited_total = 0
+        self.global_rate_limited_total = 0
+        self.retries_total = 0
+    
+    @staticmethod
+    def token_id(authorization: Optional[str]) -> str:
+        """令牌标识（不在内存中保存原始令牌）"""
+        if not authorization:
+            return ""
+        return hashlib.sha1(authorization.encode()).hexdigest()[:16]
+    
+    @staticmethod
+    def route(method: str, path: str) -> Tuple[str, str]:
+        """
+        返回 (路由模板, 主参数)
+        
+        路径中的 ID 替换为占位符，主参数（channel/guild/webhook ID）单独返回，
+        例如 GET /guilds/123/channels -> ("GET /guilds/{id}/channels", "123")。
+        """
+        major = ""
+        parts = []
+        last = 0
+        for match in _SNOWFLAKE_RE.finditer(path):
+            resource = path[:match.start()].rsplit("/", 1)[-1]
+            if not major and resource in _MAJOR_RESOURCES:
+                major = match.group(1)
+            parts.append(path[last:match.start()] + "/{id}")
+            last = match.end()
+        return f"{method} {''.join(parts)}{path[last:]}", major
+    
+    def _key(self, route: str, major: str, token_id: str) -> BucketKey:
+        return (self._bucket_hashes.get(route, route), major, token_id)
+    
+    def _get_bucket(self, route: str, major: str, token_id: str) -> RateLimitBucket:
+        key = self._key(route, major, token_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune()
+            bucket = self._buckets[key] = RateLimitBucket()
+        return bucket
+    
+    def _prune(self) -> None:
+        """清理已重置且空闲的桶"""
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if bucket.reset_at <= now and not bucket.lock.locked():
+                del self._buckets[key]
+        for token_id, reset_at in list(self._global_reset_at.items()):
+            if reset_at <= now:
+                del self._global_reset_at[token_id]
+    
+    async def acquire(self, route: str, major: str, token_id: str) -> None:
+        """等待直到该桶和该令牌的全局限制都允许发送请求"""
+        started_at = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            bucket = self._get_bucket(route, major, token_id)
+            async with bucket.lock:
+                while True:
+                    now = time.monotonic()
+                    global_reset_at = self._global_reset_at.get(token_id, 0.0)
+                    if global_reset_at > now:
+                        await asyncio.sleep(global_reset_at - now)
+                        continue
+                    if bucket.remaining <= 0 and bucket.reset_at > now:
+                        await asyncio.sleep(bucket.reset_at - now)
+                        continue
+                    break
+                if bucket.remaining <= 0:
+                    # 窗口已重置
+                    bucket.remaining = bucket.limit
+                bucket.remaining -= 1
+        finally:
+            self.queue_depth -= 1
+            waited = time.monotonic() - started_at
+            self.wait_count += 1
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+    
+    def update(self, route: str, major: str, token_id: str, headers: Mapping[str, str]) -> None:
+        """根据响应的 X-RateLimit-* 头更新桶状态"""
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash and self._bucket_hashes.get(route) != bucket_hash:
+            old_key = self._key(route, major, token_id)
+            self._bucket_hashes[route] = bucket_hash
+            new_key = self._key(route, major, token_id)
+            if new_key not in self._buckets and old_key in self._buckets:
+                self._buckets[new_key] = self._buckets.pop(old_key)
+        
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is None or reset_after is None:
+            return
+        
+        bucket = self._get_bucket(route, major, token_id)
+        try:
+            bucket.limit = int(headers.get("X-RateLimit-Limit", bucket.limit))
+            bucket.remaining = int(remaining)
+            bucket.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            pass
+    
+    def on_rate_limited(
+        self,
+        route: str,
+        major: str,
+        token_id: str,
+        retry_after: float,
+        is_global: bool
+    ) -> None:
+        """处理 429 响应：阻塞对应的桶或该令牌的全局限制，并加入随机抖动"""
+        self.rate_limited_total += 1
+        reset_at = (
+            time.monotonic()
+            + retry_after
+            + random.uniform(0, settings.DISCORD_RETRY_JITTER_SECONDS)
+        )
+        if is_global:
+            self.global_rate_limited_total += 1
+            self._global_reset_at[token_id] = max(
+                self._global_reset_at.get(token_id, 0.0), reset_at
+            )
+        else:
+            bucket = self._get_bucket(route, major, token_id)
+            bucket.remaining = 0
+            bucket.reset_at = max(bucket.reset_at, reset_at)
+    
+    @staticmethod
+    def backoff_delay(attempt: int) -> float:
+        """5xx 重试的指数退避（full jitter）"""
+        delay = min(
+            settings.DISCORD_RETRY_BACKOFF_MAX_SECONDS,
+            settings.DISCORD_RETRY_BACKOFF_BASE_SECONDS * (2 ** attempt)
+        )
+        return random.uniform(0, delay)
+    
+    def metrics(self) -> Dict[str, float]:
+        """队列深度和等待时间指标"""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "wait_count": self.wait_count,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_avg": (
+                self.wait_seconds_total / self.wait_count if self.wait_count else 0.0
+            ),
+            "max_wait_seconds": self.max_wait_seconds,
+            "rate_limited_total": self.rate_limited_total,
+            "global_rate_limited_total": self.global_rate_limited_total,
+            "retries_total": self.retries_total,
+            "buckets": len(self._buckets),
+        }
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.discord import DiscordServer, DiscordChannel
+from app.services.discord_client import DiscordClient
+from app.utils.cache import StaleWhileRevalidateCache
+
+# 按用户缓存组装好的服务器列表；只缓存完整（无错误）的结果
+_servers_cache = StaleWhileRevalidateCache(
+    maxsize=settings.DISCORD_SERVERS_CACHE_MAX_USERS,
+    ttl=settings.DISCORD_SERVERS_CACHE_TTL_SECONDS,
+    stale_ttl=settings.DISCORD_SERVERS_CACHE_STALE_SECONDS,
+    cacheable=lambda result: not result[1],
+)
+
+class DiscordService:
+    """Discord 服务器与频道组装服务"""
+    
+    @staticmethod
+    def build_server(guild: Dict, channels: List[Dict]) -> DiscordServer:
+        """根据 Discord 返回的服务器和频道数据构建服务器对象"""
+        # 过滤出文本频道
+        text_channels = [
+            DiscordChannel(
+                channel_id=channel["id"],
+                server_id=guild["id"],
+                name=channel["name"],
+                type=channel["type"],
+                position=channel.get("position", 0),
+                deep_link=DiscordClient.create_deep_link(guild["id"], channel["id"])
+            )
+            for channel in channels
+            if channel["type"] == 0  # 0 表示文本频道
+        ]
+        
+        return DiscordServer(
+            server_id=guild["id"],
+            name=guild["name"],
+            icon=guild.get("icon"),
+            channels=text_channels
+        )
+    
+    @staticmethod
+    async def fetch_servers(
+        client: DiscordClient,
+        access_token: str,
+        concurrency: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> Tuple[List[DiscordServer], Dict[str, str]]:
+        """
+        并发获取用户的服务器及其频道
+        
+        返回服务器列表和按服务器 ID 记录的错误；超过截止时间仍未完成的
+        服务器会以空频道列表返回，并记录超时错误。
+        """
+        concurrency = concurrency or settings.DISCORD_GUILD_FETCH_CONCURRENCY
+        deadline = deadline or settings.DISCORD_GUILD_FETCH_DEADLINE_SECONDS
+        
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        
+        guilds = await client.get_user_guilds(access_token)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch_channels(guild: Dict) -> List[Dict]:
+            async with semaphore:
+                return await client.get_guild_channels(access_token, guild["id"])
+        
+        tasks = [
+            (guild, asyncio.ensure_future(fetch_channels(guild)))
+            for guild in guilds
+        ]
+        pending = set()
+        if tasks:
+            remaining = max(0.0, deadline - (loop.time() - started_at))
+            _, pending = await asyncio.wait([task for _, task in tasks], timeout=remaining)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        servers = []
+        errors = {}
+        for guild, task in tasks:
+            channels = []
+            if task in pending:
+                errors[guild["id"]] = "Timed out fetching channels"
+            elif task.exception() is not None:
+                errors[guild["id"]] = str(task.exception())
+            else:
+                channels = task.result()
+            servers.append(DiscordService.build_server(guild, channels))
+        
+        return servers, errors
+    
+    @staticmethod
+    async def get_servers(
+        client: DiscordClient,
+        user_id: str,
+        access_token: str,
+        refresh: bool = False
+    ) -> Tuple[List[DiscordServer], Dict[str, str]]:
+        """
+        获取用户的服务器列表（带缓存）
+        
+        缓存过期后立即返回旧数据并在后台刷新，同一用户的并发刷新会合并。
+        """
+        return await _servers_cache.get(
+            user_id,
+            lambda: DiscordService.fetch_servers(client, access_token),
+            refresh=refresh
+        )
+    
+    @staticmethod
+    def invalidate_servers(user_id: str) -> None:
+        """清除用户的服务器缓存"""
+        _servers_cache.invalidate(user_id)
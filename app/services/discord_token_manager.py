@@ -0,0 +1,224 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from weakref import WeakValueDictionary
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.principal_cache import principal_cache
+from app.models.discord import DiscordAccount
+from app.models.user import User
+from app.services.discord_client import DiscordClient, discord_client
+from app.services.leader_lease import LeaderLease
+from app.utils.logger import log_error, log_info, log_warning
+
+class DiscordTokenManager:
+    """
+    Discord 令牌管理服务
+    
+    在令牌到期前主动刷新；同一账号的刷新在进程内单飞执行，跨进程以用户文档上的
+    租约互斥，写回时以旧的 refresh_token 作为条件。后台批量刷新只在选出的一个 worker 中运行。
+    """
+    
+    def __init__(self, client: DiscordClient):
+        self.client = client
+        self._locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        self._failed_until: Dict[ObjectId, datetime] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        # 租约时长覆盖两个周期，持有者每轮续约
+        self._sweeper_lease = LeaderLease(
+            "discord_token_sweeper", settings.DISCORD_TOKEN_SWEEP_INTERVAL_SECONDS * 2
+        )
+    
+    def _lock_for(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        return lock
+    
+    @staticmethod
+    def _needs_refresh(account: DiscordAccount, ahead_seconds: float) -> bool:
+        return account.token_expires_at <= datetime.utcnow() + timedelta(seconds=ahead_seconds)
+    
+    async def ensure_fresh(self, user: User) -> DiscordAccount:
+        """确保用户的 Discord 令牌在短时间内不会过期，必要时刷新"""
+        account = user.discord_account
+        if not self._needs_refresh(account, settings.DISCORD_TOKEN_REFRESH_SKEW_SECONDS):
+            return account
+        return await self.refresh(user, settings.DISCORD_TOKEN_REFRESH_SKEW_SECONDS)
+    
+    async def _claim_lease(self, user_id: ObjectId, refresh_token: str) -> bool:
+        """以当前 refresh_token 为条件获取刷新租约，其他进程持有未过期的租约时失败"""
+        now = datetime.utcnow()
+        result = await User.get_motor_collection().update_one(
+            {
+                "_id": user_id,
+                "discord_account.refresh_token": refresh_token,
+                "$or": [
+                    {"discord_account.refresh_lease_until": None},
+                    {"discord_account.refresh_lease_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "discord_account.refresh_lease_until": now + timedelta(
+                        seconds=settings.DISCORD_TOKEN_REFRESH_LEASE_SECONDS
+                    )
+                }
+            }
+        )
+        return result.modified_count > 0
+    
+    async def _refresh_with_lease(self, user_id: ObjectId, account: DiscordAccount) -> DiscordAccount:
+        """持有租约时调用 Discord 刷新并写回，失败时释放租约"""
+        collection = User.get_motor_collection()
+        try:
+            token_data = await self.client.refresh_discord_token(account.refresh_token)
+        except Exception:
+            await collection.update_one(
+                {"_id": user_id, "discord_account.refresh_token": account.refresh_token},
+                {"$unset": {"discord_account.refresh_lease_until": ""}}
+            )
+            raise
+        
+        expires_at = datetime.utcnow() + timedelta(seconds=token_data["expires_in"])
+        result = await collection.update_one(
+            {
+                "_id": user_id,
+                "discord_account.refresh_token": account.refresh_token,
+            },
+            {
+                "$set": {
+                    "discord_account.access_token": token_data["access_token"],
+                    "discord_account.refresh_token": token_data["refresh_token"],
+                    "discord_account.token_expires_at": expires_at,
+                },
+                "$unset": {"discord_account.refresh_lease_until": ""},
+            }
+        )
+        if not result.modified_count:
+            # 租约过期后被其他进程接手并抢先写回
+            log_warning(
+                "Discord token was refreshed concurrently elsewhere",
+                extra={"user_id": str(user_id)}
+            )
+            stored = await User.get(user_id)
+            return stored.discord_account
+        
+        account.access_token = token_data["access_token"]
+        account.refresh_token = token_data["refresh_token"]
+        account.token_expires_at = expires_at
+        account.refresh_lease_until = None
+        return account
+    
+    async def refresh(self, user: User, ahead_seconds: float) -> DiscordAccount:
+        """
+        刷新用户的 Discord 令牌
+        
+        进程内同一账号只有一个协程执行；跨进程通过用户文档上的租约互斥，
+        未取得租约时等待持有者写回新令牌。
+        """
+        user_id = str(user.id)
+        async with self._lock_for(user_id):
+            deadline = datetime.utcnow() + timedelta(
+                seconds=settings.DISCORD_TOKEN_REFRESH_LEASE_SECONDS
+            )
+            while True:
+                # 等待期间令牌可能已被其他请求或其他进程刷新
+                stored = await User.get(user.id)
+                if stored is None or stored.discord_account is None:
+                    raise ValueError("Discord account not linked")
+                account = stored.discord_account
+                if not self._needs_refresh(account, ahead_seconds):
+                    break
+                
+                if await self._claim_lease(stored.id, account.refresh_token):
+                    account = await self._refresh_with_lease(stored.id, account)
+                    principal_cache.invalidate_user(user_id)
+                    break
+                
+                if datetime.utcnow() >= deadline:
+                    raise TimeoutError("Discord token refresh in progress in another worker")
+                await asyncio.sleep(settings.DISCORD_TOKEN_REFRESH_LEASE_POLL_SECONDS)
+            
+            user.discord_account = account
+            return account
+    
+    async def sweep(self) -> int:
+        """分批刷新即将过期的令牌，返回成功刷新的账号数"""
+        now = datetime.utcnow()
+        horizon = now + timedelta(seconds=settings.DISCORD_TOKEN_SWEEP_AHEAD_SECONDS)
+        self._failed_until = {
+            user_id: until for user_id, until in self._failed_until.items() if until > now
+        }
+        semaphore = asyncio.Semaphore(settings.DISCORD_TOKEN_SWEEP_CONCURRENCY)
+        
+        async def refresh_one(user: User) -> bool:
+            async with semaphore:
+                try:
+                    await self.refresh(user, settings.DISCORD_TOKEN_SWEEP_AHEAD_SECONDS)
+                    return True
+                except Exception as e:
+                    # 失败的账号暂时跳过，避免每轮重复请求
+                    self._failed_until[user.id] = now + timedelta(
+                        seconds=settings.DISCORD_TOKEN_SWEEP_FAILURE_BACKOFF_SECONDS
+                    )
+                    log_warning(
+                        f"Failed to refresh Discord token: {str(e)}",
+                        extra={"user_id": str(user.id)}
+                    )
+                    return False
+        
+        refreshed = 0
+        while True:
+            query = {"discord_account.token_expires_at": {"$gt": now, "$lte": horizon}}
+            if self._failed_until:
+                query["_id"] = {"$nin": list(self._failed_until)}
+            users = await User.find(query).sort(
+                "discord_account.token_expires_at"
+            ).limit(settings.DISCORD_TOKEN_SWEEP_BATCH_SIZE).to_list()
+            if not users:
+                break
+            
+            results = await asyncio.gather(*(refresh_one(u) for u in users))
+            refreshed += sum(results)
+            if len(users) < settings.DISCORD_TOKEN_SWEEP_BATCH_SIZE:
+                break
+        
+        if refreshed:
+            log_info(f"Refreshed {refreshed} Discord tokens")
+        return refreshed
+    
+    async def _run_sweeper(self) -> None:
+        while True:
+            try:
+                if await self._sweeper_lease.try_acquire():
+                    await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log_error("Discord token sweep failed", exc_info=True)
+            await asyncio.sleep(settings.DISCORD_TOKEN_SWEEP_INTERVAL_SECONDS)
+    
+    def start(self) -> None:
+        """启动后台刷新任务"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._run_sweeper())
+    
+    async def stop(self) -> None:
+        """停止后台刷新任务"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+            try:
+                await self._sweeper_lease.release()
+            except Exception:
+                log_warning("Failed to release Discord token sweeper lease")
+
+discord_token_manager = DiscordTokenManager(discord_client)
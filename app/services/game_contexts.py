@@ -0,0 +1,200 @@
+import heapq
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterator, List, Set
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.models.game import Game, GameContextStats
+from app.services.game_registry import game_registry
+from app.services.write_behind import WriteBehindBuffer
+from app.utils.helpers import extract_input_context
+from app.utils.logger import log_error
+from app.utils.sketch import CountMinSketch
+
+def _chunks(values: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+class GameContextBuffer(WriteBehindBuffer):
+    """
+    游戏上下文上报缓冲
+
+    按包名合并每个上下文的上报次数，定期批量写入 GameContextStats：
+    计数器以 $inc 原子累加到 Count-Min Sketch，再据估计频率更新 top-K；
+    只有 top-K 的上下文集合变化时才写入 Game.reported_contexts（未知游戏此时创建），
+    人工维护的 input_contexts 不受影响。
+    缓冲区满时拒绝上报而不是阻塞请求。
+    """
+
+    def __init__(self, flush_interval: float, max_size: int, max_per_game: int):
+        super().__init__(flush_interval=flush_interval, max_size=max_size)
+        self.max_per_game = max_per_game
+        self.sketch = CountMinSketch(
+            width=settings.GAME_CONTEXT_SKETCH_WIDTH,
+            depth=settings.GAME_CONTEXT_SKETCH_DEPTH,
+        )
+        self.accepted = 0
+        self.rejected = 0
+
+    def _merge(self, old: Dict[str, int], new: Dict[str, int]) -> Dict[str, int]:
+        for context, count in new.items():
+            old[context] = old.get(context, 0) + count
+        return old
+
+    def _collection(self) -> AsyncIOMotorCollection:
+        return GameContextStats.get_motor_collection()
+
+    def _build_operations(self, items: Dict[Hashable, Any]) -> List[UpdateOne]:
+        """累加各游戏的 sketch 计数器"""
+        now = datetime.utcnow()
+        operations = []
+        for package_name, counts in items.items():
+            increments: Dict[str, int] = {"total": sum(counts.values())}
+            for context, count in counts.items():
+                for cell in self.sketch.cells(context):
+                    field = f"cms.{cell}"
+                    increments[field] = increments.get(field, 0) + count
+            operations.append(UpdateOne(
+                {"package_name": package_name},
+                {
+                    "$inc": increments,
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"top": []},
+                },
+                upsert=True
+            ))
+        return operations
+
+    def _top_k(self, counters: Dict[str, int], candidates: Set[str]) -> List[Dict[str, Any]]:
+        """从候选上下文中按估计频率选出新的 top-K"""
+        return [
+            {"context": context, "count": count}
+            for count, context in heapq.nlargest(
+                settings.GAME_CONTEXT_TOP_K,
+                ((self.sketch.estimate(counters, context), context) for context in candidates)
+            )
+        ]
+
+    async def _write(self, items: Dict[Hashable, Any]) -> List[Hashable]:
+        retry = await super()._write(items)
+        # 计数器已经写入，之后失败不能让基类放回缓冲区重试，否则会重复计数；
+        # top-K 只是派生数据，下次该游戏有上报时会重新计算
+        failed = set(retry)
+        try:
+            await self._update_top({k: v for k, v in items.items() if k not in failed})
+        except Exception:
+            log_error("Game context top-K update failed", exc_info=True)
+        return retry
+
+    async def _update_top(self, items: Dict[Hashable, Any]) -> None:
+        """
+        重新计算本批游戏的 top-K
+
+        先读取原 top-K 确定候选（原 top-K 加本批上下文），再只投影候选对应的
+        sketch 单元，避免读取整个计数器字典。
+        """
+        if not items:
+            return
+        stats_collection = self._collection()
+        candidates: Dict[str, Set[str]] = {}
+        old_tops: Dict[str, List[Dict[str, Any]]] = {}
+        async for stats in stats_collection.find(
+            {"package_name": {"$in": list(items)}},
+            projection={"package_name": 1, "top": 1}
+        ):
+            package_name = stats["package_name"]
+            old_tops[package_name] = stats.get("top", [])
+            candidates[package_name] = {entry["context"] for entry in old_tops[package_name]}
+            candidates[package_name].update(items[package_name])
+
+        for chunk in _chunks(list(candidates), settings.GAME_CONTEXT_TOP_BATCH_SIZE):
+            cells = {
+                f"cms.{cell}": 1
+                for package_name in chunk
+                for context in candidates[package_name]
+                for cell in self.sketch.cells(context)
+            }
+            await self._update_top_chunk(stats_collection, chunk, cells, candidates, old_tops)
+
+    async def _update_top_chunk(
+        self,
+        stats_collection: AsyncIOMotorCollection,
+        package_names: List[str],
+        cells: Dict[str, int],
+        candidates: Dict[str, Set[str]],
+        old_tops: Dict[str, List[Dict[str, Any]]],
+    ) -> None:
+        now = datetime.utcnow()
+        stats_updates: List[UpdateOne] = []
+        game_updates: List[UpdateOne] = []
+        async for stats in stats_collection.find(
+            {"package_name": {"$in": package_names}},
+            projection={"package_name": 1, **cells}
+        ):
+            package_name = stats["package_name"]
+            old_top = old_tops[package_name]
+            new_top = self._top_k(stats.get("cms", {}), candidates[package_name])
+            if new_top == old_top:
+                continue
+            stats_updates.append(
+                UpdateOne({"_id": stats["_id"]}, {"$set": {"top": new_top}})
+            )
+
+            contexts = [entry["context"] for entry in new_top]
+            found_game = game_registry.get_by_package_name(package_name)
+            if found_game is None or set(found_game.reported_contexts) != set(contexts):
+                game_updates.append(UpdateOne(
+                    {"package_name": package_name},
+                    {
+                        "$set": {"reported_contexts": contexts, "updated_at": now},
+                        "$setOnInsert": {
+                            "name": f"Unknown Game ({package_name})",
+                            "icon_url": None,
+                            "description": None,
+                            "input_contexts": [],
+                            "created_at": now,
+                        },
+                    },
+                    upsert=True
+                ))
+
+        if stats_updates:
+            await stats_collection.bulk_write(stats_updates, ordered=False)
+        if game_updates:
+            await Game.get_motor_collection().bulk_write(game_updates, ordered=False)
+
+    def submit(self, package_name: str, context: str) -> bool:
+        """
+        提交一次上报，返回 False 表示缓冲区已满，调用方应稍后重试
+        """
+        context = extract_input_context(context)
+        if context is None:
+            return True
+
+        pending = self._pending.get(package_name)
+        if pending is None:
+            if len(self._pending) >= self.max_size:
+                self.rejected += 1
+                return False
+        elif context not in pending and len(pending) >= self.max_per_game:
+            self.rejected += 1
+            return False
+
+        self.add(package_name, {context: 1})
+        self.accepted += 1
+        return True
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "pending_games": len(self),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        }
+
+game_context_buffer = GameContextBuffer(
+    flush_interval=settings.GAME_CONTEXT_FLUSH_INTERVAL_SECONDS,
+    max_size=settings.GAME_CONTEXT_BUFFER_MAX_GAMES,
+    max_per_game=settings.GAME_CONTEXT_MAX_PENDING_PER_GAME,
+)
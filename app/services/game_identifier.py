@@ -0,0 +1,120 @@
+import asyncio
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.game import Game
+from app.services.game_registry import game_registry
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.helpers import extract_input_context
+from app.utils.logger import log_error, log_info
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_context(text: str) -> str:
+    """匹配前统一大小写和空白"""
+    return _WHITESPACE.sub(" ", text.casefold()).strip()
+
+class GameIdentifier:
+    """
+    根据输入框上下文识别游戏
+
+    用全部游戏的 input_contexts 和 reported_contexts 构建一个 Aho-Corasick 自动机，一次扫描找出输入中
+    出现的所有已知上下文。注册表变更后在后台线程重建并原子替换，识别请求不等待重建。
+    """
+
+    def __init__(self):
+        self._matcher: Optional[AhoCorasick] = None
+        # 模式下标 -> 包含该上下文的游戏 ID
+        self._pattern_games: List[List[str]] = []
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    @staticmethod
+    def _build(games: List[Game]) -> Tuple[AhoCorasick, List[List[str]]]:
+        games_by_pattern: Dict[str, Set[str]] = defaultdict(set)
+        for game in games:
+            for context in {*game.input_contexts, *game.reported_contexts}:
+                pattern = normalize_context(context)
+                if len(pattern) >= settings.GAME_IDENTIFY_MIN_PATTERN_LENGTH:
+                    games_by_pattern[pattern].add(str(game.id))
+        patterns = list(games_by_pattern)
+        return AhoCorasick(patterns), [sorted(games_by_pattern[p]) for p in patterns]
+
+    async def rebuild(self) -> int:
+        """在线程池中重建自动机，返回模式数量"""
+        matcher, pattern_games = await asyncio.get_running_loop().run_in_executor(
+            None, self._build, game_registry.all()
+        )
+        self._matcher, self._pattern_games = matcher, pattern_games
+        log_info(f"Game identifier rebuilt with {len(matcher)} contexts")
+        return len(matcher)
+
+    async def _rebuild_loop(self) -> None:
+        # 合并短时间内的连续变更
+        while self._dirty:
+            self._dirty = False
+            await asyncio.sleep(settings.GAME_IDENTIFY_REBUILD_DELAY_SECONDS)
+            try:
+                await self.rebuild()
+            except Exception:
+                log_error("Game identifier rebuild failed", exc_info=True)
+
+    def schedule_rebuild(self) -> None:
+        """标记需要重建；已有重建任务时由其负责"""
+        self._dirty = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            try:
+                self._rebuild_task = asyncio.get_running_loop().create_task(self._rebuild_loop())
+            except RuntimeError:
+                # 没有运行中的事件循环（如脚本中加载注册表），等待下次变更或手动重建
+                pass
+
+    def identify(
+        self,
+        context: str,
+        package_name: Optional[str] = None,
+        limit: int = 5
+    ) -> List[Tuple[Game, float, List[str]]]:
+        """
+        返回按得分排序的候选游戏及命中的上下文
+
+        得分为命中上下文覆盖输入的比例（0~1）；包名与游戏一致时再加 1。
+        """
+        text = normalize_context(extract_input_context(context) or "")
+        matched: Dict[str, Set[int]] = defaultdict(set)
+        if self._matcher is not None and text:
+            for index in self._matcher.iter_matches(text):
+                for game_id in self._pattern_games[index]:
+                    matched[game_id].add(index)
+
+        package_game = game_registry.get_by_package_name(package_name) if package_name else None
+        if package_game is not None:
+            matched.setdefault(str(package_game.id), set())
+
+        candidates = []
+        for game_id, indexes in matched.items():
+            game = game_registry.get(game_id)
+            if game is None:
+                continue
+            contexts = sorted((self._matcher.patterns[i] for i in indexes), key=len, reverse=True)
+            score = min(1.0, sum(len(c) for c in contexts) / len(text)) if text else 0.0
+            if package_game is not None and game is package_game:
+                score += 1.0
+            candidates.append((game, round(score, 4), contexts))
+
+        candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+        return candidates[:limit]
+
+    async def stop(self) -> None:
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            try:
+                await self._rebuild_task
+            except asyncio.CancelledError:
+                pass
+            self._rebuild_task = None
+
+game_identifier = GameIdentifier()
+game_registry.subscribe(game_identifier.schedule_rebuild)
@@ -0,0 +1,183 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.game import Game
+from app.utils.cache import TTLCache
+from app.utils.helpers import is_valid_object_id
+from app.utils.logger import log_error, log_info, log_warning
+
+def _versions(games: Dict[str, Game]) -> Dict[str, Any]:
+    return {game_id: game.updated_at for game_id, game in games.items()}
+
+class GameRegistry:
+    """
+    进程内的游戏注册表，按包名和 ID 索引全部 Game 文档
+
+    启动时全量加载，之后通过 MongoDB change stream 增量更新；
+    部署不支持 change stream（如单机 mongod）时退化为定期全量重载。
+    返回的 Game 对象在请求之间共享，调用方不得修改。
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Game] = {}
+        self._by_package: Dict[str, Game] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        self._polling = False
+        self._listeners: List[Callable[[], None]] = []
+        self._misses = TTLCache(
+            maxsize=settings.GAME_REGISTRY_MISS_CACHE_SIZE,
+            ttl=settings.GAME_REGISTRY_MISS_TTL_SECONDS,
+        )
+
+    def subscribe(self, listener: Callable[[], None]) -> None:
+        """注册变更回调，注册表内容变化（包括全量重载）后同步调用"""
+        self._listeners.append(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception:
+                log_error("Game registry listener failed", exc_info=True)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def all(self) -> List[Game]:
+        return list(self._by_id.values())
+
+    def get(self, game_id: str) -> Optional[Game]:
+        return self._by_id.get(str(game_id))
+
+    def get_by_package_name(self, package_name: str) -> Optional[Game]:
+        return self._by_package.get(package_name)
+
+    async def find(self, game_id: str) -> Optional[Game]:
+        """
+        按 ID 查找游戏，注册表中没有时查询数据库
+
+        其他进程刚创建的游戏可能尚未通过 change stream 或轮询同步过来；
+        数据库中也不存在的键短时间缓存，避免反复查询。
+        """
+        game_id = str(game_id)
+        found = self.get(game_id)
+        if found is not None or not is_valid_object_id(game_id):
+            return found
+        return await self._find_missing(("id", game_id), lambda: Game.get(game_id))
+
+    async def find_by_package_name(self, package_name: str) -> Optional[Game]:
+        """按包名查找游戏，注册表中没有时查询数据库（同 find）"""
+        found = self.get_by_package_name(package_name)
+        if found is not None:
+            return found
+        return await self._find_missing(
+            ("package", package_name),
+            lambda: Game.find_one(Game.package_name == package_name)
+        )
+
+    async def _find_missing(
+        self, key: Tuple[str, str], query: Callable[[], Awaitable[Optional[Game]]]
+    ) -> Optional[Game]:
+        if self._misses.get(key):
+            return None
+        found = await query()
+        if found is None:
+            self._misses.set(key, True)
+        elif self.ready:
+            self.put(found)
+        return found
+
+    def put(self, game: Game) -> None:
+        """写入或替换游戏（本进程的写操作立即可见，无需等待 change stream）"""
+        game_id = str(game.id)
+        old = self._by_id.get(game_id)
+        if old is not None and self._by_package.get(old.package_name) is old:
+            del self._by_package[old.package_name]
+        self._by_id[game_id] = game
+        self._by_package[game.package_name] = game
+        self._misses.pop(("id", game_id))
+        self._misses.pop(("package", game.package_name))
+        self._notify()
+
+    def remove(self, game_id: str) -> None:
+        old = self._by_id.pop(str(game_id), None)
+        if old is not None:
+            if self._by_package.get(old.package_name) is old:
+                del self._by_package[old.package_name]
+            self._notify()
+
+    async def load(self) -> int:
+        """从数据库全量加载，完成后原子替换"""
+        games = await Game.find().to_list()
+        by_id = {str(game.id): game for game in games}
+        changed = not self.ready or _versions(by_id) != _versions(self._by_id)
+        self._by_id = by_id
+        self._by_package = {game.package_name: game for game in games}
+        self._misses.clear()
+        self.ready = True
+        if changed:
+            self._notify()
+        return len(games)
+
+    def _apply_change(self, change: Dict[str, Any]) -> None:
+        operation = change["operationType"]
+        if operation in ("insert", "update", "replace"):
+            document = change.get("fullDocument")
+            if document is not None:
+                self.put(Game.parse_obj(document))
+            else:
+                # updateLookup 时文档已被删除
+                self.remove(change["documentKey"]["_id"])
+        elif operation == "delete":
+            self.remove(change["documentKey"]["_id"])
+
+    async def _watch(self) -> None:
+        """先打开 change stream 再全量加载，避免漏掉两者之间的变更"""
+        async with Game.get_motor_collection().watch(full_document="updateLookup") as stream:
+            count = await self.load()
+            if self._polling:
+                log_info("Game change stream available again")
+                self._polling = False
+            log_info(f"Game registry loaded {count} games, watching for changes")
+            async for change in stream:
+                self._apply_change(change)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._polling:
+                    log_warning(f"Game change stream unavailable, polling instead: {e}")
+                    self._polling = True
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log_error("Game registry reload failed", exc_info=True)
+            await asyncio.sleep(settings.GAME_REGISTRY_POLL_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        """加载注册表并在后台保持更新"""
+        if self._task is None:
+            try:
+                await self.load()
+            except Exception:
+                log_error("Game registry initial load failed", exc_info=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+game_registry = GameRegistry()
@@ -0,0 +1,50 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from app.models.lease import Lease
+
+# 当前进程的唯一标识
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class LeaderLease:
+    """
+    基于 MongoDB 的命名租约
+
+    持有者在租约到期前续约即可保持身份；租约过期后任一进程都可以接手。
+    """
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+
+    async def try_acquire(self) -> bool:
+        """获取或续约租约，返回当前进程是否为持有者"""
+        now = datetime.utcnow()
+        try:
+            await Lease.get_motor_collection().update_one(
+                {
+                    "name": self.name,
+                    "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": WORKER_ID,
+                        "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    }
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # 租约由其他进程持有且未过期，upsert 与已有文档冲突
+            return False
+        return True
+
+    async def release(self) -> None:
+        """主动释放租约，便于其他进程立即接手"""
+        await Lease.get_motor_collection().delete_one(
+            {"name": self.name, "owner": WORKER_ID}
+        )
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+
+from pymongo import DESCENDING
+
+from app.core.config import settings
+from app.models.game import Game
+from app.models.template import Template
+from app.utils.cache import StaleWhileRevalidateCache
+
+class TemplateBundle:
+    """预编译的游戏模板包"""
+    
+    __slots__ = ("etag", "gzip_etag", "body", "gzip_body", "built_at")
+    
+    def __init__(self, body: bytes):
+        digest = hashlib.sha256(body).hexdigest()
+        # 强 ETag 标识具体的字节表示，gzip 编码需要不同的值
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.body = body
+        self.gzip_body = gzip.compress(body, mtime=0)
+        self.built_at = datetime.utcnow()
+
+# 按游戏缓存模板包；模板变更时标记过期，在后台只重建该游戏的模板包
+_bundle_cache = StaleWhileRevalidateCache(
+    maxsize=settings.TEMPLATE_BUNDLE_CACHE_MAX_GAMES,
+    ttl=settings.TEMPLATE_BUNDLE_REFRESH_SECONDS,
+    stale_ttl=settings.TEMPLATE_BUNDLE_STALE_SECONDS,
+)
+
+class TemplateBundleService:
+    """游戏公共模板包服务"""
+    
+    @staticmethod
+    async def build_bundle(game: Game) -> TemplateBundle:
+        """读取游戏最热门的公共模板并编码为紧凑 JSON"""
+        cursor = Template.get_motor_collection().find(
+            {"is_public": True, "game.$id": game.id},
+            projection={
+                "title": 1, "content": 1, "category": 1, "tags": 1, "usage_count": 1,
+            },
+            sort=[("usage_count", DESCENDING), ("_id", DESCENDING)],
+            limit=settings.TEMPLATE_BUNDLE_SIZE
+        )
+        templates = [
+            {
+                "id": str(doc["_id"]),
+                "title": doc["title"],
+                "content": doc["content"],
+                "category": doc["category"],
+                "tags": doc.get("tags", []),
+                "usage_count": doc.get("usage_count", 0),
+            }
+            async for doc in cursor
+        ]
+        body = json.dumps(
+            {
+                "game_id": str(game.id),
+                "package_name": game.package_name,
+                "name": game.name,
+                "templates": templates,
+            },
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode()
+        return TemplateBundle(body)
+    
+    @staticmethod
+    async def get_bundle(game: Game) -> TemplateBundle:
+        """获取游戏模板包（过期时先返回旧包并在后台重建）"""
+        return await _bundle_cache.get(
+            str(game.id),
+            lambda: TemplateBundleService.build_bundle(game)
+        )
+    
+    @staticmethod
+    def mark_stale(game_id: Optional[str]) -> None:
+        """游戏的公共模板变更后标记模板包需要重建"""
+        if game_id:
+            _bundle_cache.mark_stale(game_id)
@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.template import Template
+from app.utils.helpers import link_id
+from app.utils.logger import log_error, log_info
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为小写词元"""
+    return _TOKEN_RE.findall(text.lower())
+
+class _Entry:
+    __slots__ = ("title", "category", "usage_count", "is_public", "owner_id", "game_id", "keys")
+    
+    def __init__(self, title, category, usage_count, is_public, owner_id, game_id, keys):
+        self.title = title
+        self.category = category
+        self.usage_count = usage_count
+        self.is_public = is_public
+        self.owner_id = owner_id
+        self.game_id = game_id
+        self.keys = keys
+
+class TemplateSearchIndex:
+    """
+    进程内模板搜索索引
+    
+    标题和标签的词元按前缀（边缘 n-gram）建立倒排表以支持输入时补全，
+    标题、标签和内容的完整词元另建倒排表；结果按 usage_count 排序。
+    模板写入时增量更新，并定期全量重建以同步其他进程的修改；
+    其他进程的删除和取消公开在重建前由 TemplateService 查询时向数据库确认。
+    """
+    
+    def __init__(self, max_prefix_length: int = settings.TEMPLATE_SEARCH_MAX_PREFIX_LENGTH):
+        self.max_prefix_length = max_prefix_length
+        self._entries: Dict[str, _Entry] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._words: Dict[str, Set[str]] = {}
+        # 大倒排表按 usage_count 倒序排好的 ID 列表（重建时计算），以及之后新增的 ID
+        self._ranked: Dict[str, List[str]] = {}
+        self._recent: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 重建期间的增量更新同时写入正在构建的新索引
+        self._building: Optional["TemplateSearchIndex"] = None
+        self.ready = False
+    
+    def _index_keys(self, title: str, tags: Iterable[str], content: str) -> Tuple[str, ...]:
+        keys = set()
+        for token in tokenize(" ".join([title, *tags])):
+            for i in range(1, min(len(token), self.max_prefix_length) + 1):
+                keys.add("p:" + token[:i])
+        for token in tokenize(" ".join([title, *tags, content])):
+            keys.add("w:" + token)
+        return tuple(keys)
+    
+    def _postings(self, key: str) -> Dict[str, Set[str]]:
+        return self._prefixes if key.startswith("p:") else self._words
+    
+    def _add(self, template_id: str, entry: _Entry) -> None:
+        self._entries[template_id] = entry
+        for key in entry.keys:
+            self._postings(key).setdefault(key[2:], set()).add(template_id)
+            if key in self._ranked:
+                self._recent.setdefault(key, set()).add(template_id)
+    
+    def remove(self, template_id: str) -> None:
+        """从索引中移除模板"""
+        if self._building is not None:
+            self._building.remove(template_id)
+        entry = self._entries.pop(template_id, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            recent = self._recent.get(key)
+            if recent is not None:
+                recent.discard(template_id)
+            postings = self._postings(key)
+            ids = postings.get(key[2:])
+            if ids is not None:
+                ids.discard(template_id)
+                if not ids:
+                    del postings[key[2:]]
+    
+    def _entry_for(self, template: Template, owner_id: str, game_id: Optional[str]) -> _Entry:
+        return _Entry(
+            title=template.title,
+            category=template.category,
+            usage_count=template.usage_count,
+            is_public=template.is_public,
+            owner_id=owner_id,
+            game_id=game_id,
+            keys=self._index_keys(template.title, template.tags, template.content),
+        )
+    
+    def upsert(self, template: Template) -> None:
+        """新增或更新模板的索引"""
+        template_id = str(template.id)
+        self.remove(template_id)
+        entry = self._entry_for(template, link_id(template.owner), link_id(template.game))
+        self._add(template_id, entry)
+        if self._building is not None:
+            self._building._add(template_id, entry)
+    
+    def add_usage(self, template_id: str, count: int = 1) -> None:
+        """同步本进程记录的使用次数，用于排序"""
+        entry = self._entries.get(template_id)
+        if entry is not None:
+            entry.usage_count += count
+        if self._building is not None:
+            building_entry = self._building._entries.get(template_id)
+            if building_entry is not None and building_entry is not entry:
+                building_entry.usage_count += count
+    
+    def _posting(self, key: str) -> Set[str]:
+        return self._postings(key).get(key[2:], set())
+    
+    def _scan_ranked(self, key: str, accept, limit: int) -> Iterator[str]:
+        """
+        按 usage_count 从高到低扫描大倒排表，找到 limit 个结果或达到扫描上限即停止
+        
+        排名在重建时计算，之后新增的 ID 全部参与比较；已删除的 ID 按当前倒排表跳过。
+        """
+        posting = self._posting(key)
+        found = 0
+        for scanned, template_id in enumerate(self._ranked[key]):
+            if found >= limit or scanned >= settings.TEMPLATE_SEARCH_MAX_SCAN:
+                break
+            if template_id in posting and accept(template_id):
+                found += 1
+                yield template_id
+        yield from (t for t in self._recent.get(key, ()) if accept(t))
+    
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        game_id: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Tuple[str, _Entry]]:
+        """
+        搜索本进程索引中对用户可见的模板（结果需由调用方向数据库确认可见性）
+        
+        最后一个词按前缀匹配（标题/标签）或完整匹配（内容），其余词需完整匹配。
+        候选集较小时全部排序；否则按预先排好的使用次数顺序扫描最后一个词的倒排表并提前结束。
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        
+        *full_terms, last = terms
+        last_keys = [
+            key for key in ("p:" + last[:self.max_prefix_length], "w:" + last)
+            if self._posting(key)
+        ]
+        if not last_keys:
+            return []
+        full_sets = sorted((self._words.get(term, set()) for term in full_terms), key=len)
+        if full_sets and not full_sets[0]:
+            return []
+        last_sets = [self._posting(key) for key in last_keys]
+        
+        entries = self._entries
+        
+        def visible(template_id: str) -> bool:
+            entry = entries.get(template_id)
+            return (
+                entry is not None
+                and (entry.is_public or entry.owner_id == user_id)
+                and (game_id is None or entry.game_id == game_id)
+            )
+        
+        def in_all(template_id: str, sets: List[Set[str]]) -> bool:
+            return all(template_id in other for other in sets)
+        
+        small = settings.TEMPLATE_SEARCH_RANKED_MIN_POSTINGS
+        if full_sets and len(full_sets[0]) <= small:
+            # 由最小的完整词倒排表驱动
+            candidates: Iterable[str] = (
+                t for t in full_sets[0]
+                if in_all(t, full_sets[1:]) and any(t in ids for ids in last_sets) and visible(t)
+            )
+        elif sum(len(ids) for ids in last_sets) <= small or not any(k in self._ranked for k in last_keys):
+            candidates = (
+                t for ids in last_sets for t in ids
+                if in_all(t, full_sets) and visible(t)
+            )
+        else:
+            # 短前缀等大倒排表：按使用次数顺序扫描，找到足够结果即停止
+            accept = lambda t: in_all(t, full_sets) and visible(t)
+            candidates = (
+                t
+                for key in last_keys
+                for t in (
+                    self._scan_ranked(key, accept, limit) if key in self._ranked
+                    else (t for t in self._posting(key) if accept(t))
+                )
+            )
+        
+        matches = {t: entries[t] for t in candidates}
+        return heapq.nlargest(limit, matches.items(), key=lambda item: item[1].usage_count)
+    
+    def apply_visibility(self, template_id: str, doc: Optional[Dict[str, Any]]) -> None:
+        """用数据库中的最新状态修正索引条目（doc 为空表示模板已删除）"""
+        if doc is None:
+            self.remove(template_id)
+            return
+        for index in (self, self._building):
+            entry = index._entries.get(template_id) if index is not None else None
+            if entry is not None:
+                entry.is_public = doc.get("is_public", False)
+                entry.usage_count = doc.get("usage_count", entry.usage_count)
+    
+    @staticmethod
+    def _rank(entries: Dict[str, _Entry], ids: List[str]) -> List[str]:
+        return sorted(
+            ids,
+            key=lambda t: entries[t].usage_count if t in entries else 0,
+            reverse=True
+        )
+    
+    async def _build_rankings(self, index: "TemplateSearchIndex") -> None:
+        """在线程池中为大倒排表排序，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        ranked = {}
+        for postings, prefix in ((index._prefixes, "p:"), (index._words, "w:")):
+            for term, ids in list(postings.items()):
+                if len(ids) >= settings.TEMPLATE_SEARCH_RANKED_MIN_POSTINGS:
+                    ranked[prefix + term] = await loop.run_in_executor(
+                        None, self._rank, index._entries, list(ids)
+                    )
+        index._ranked = ranked
+        index._recent = {}
+    
+    async def rebuild(self) -> int:
+        """从数据库全量重建索引，完成后原子替换"""
+        fresh = TemplateSearchIndex(self.max_prefix_length)
+        self._building = fresh
+        try:
+            await self._load(fresh)
+            await self._build_rankings(fresh)
+        finally:
+            self._building = None
+        
+        self._entries = fresh._entries
+        self._prefixes = fresh._prefixes
+        self._words = fresh._words
+        self._ranked = fresh._ranked
+        self._recent = fresh._recent
+        self.ready = True
+        log_info(f"Template search index rebuilt with {len(self._entries)} templates")
+        return len(self._entries)
+    
+    @staticmethod
+    async def _load(fresh: "TemplateSearchIndex") -> None:
+        collection = Template.get_motor_collection()
+        cursor = collection.find(
+            {},
+            projection={
+                "title": 1, "tags": 1, "content": 1, "category": 1,
+                "usage_count": 1, "is_public": 1, "owner": 1, "game": 1,
+            },
+            batch_size=1000
+        )
+        async for doc in cursor:
+            template_id = str(doc["_id"])
+            if template_id in fresh._entries:
+                # 已由重建期间的增量更新写入
+                continue
+            game = doc.get("game")
+            fresh._add(template_id, _Entry(
+                title=doc.get("title", ""),
+                category=doc.get("category", ""),
+                usage_count=doc.get("usage_count", 0),
+                is_public=doc.get("is_public", False),
+                owner_id=str(doc["owner"].id),
+                game_id=str(game.id) if game else None,
+                keys=fresh._index_keys(
+                    doc.get("title", ""), doc.get("tags", []), doc.get("content", "")
+                ),
+            ))
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log_error("Template search index rebuild failed", exc_info=True)
+            await asyncio.sleep(settings.TEMPLATE_SEARCH_REBUILD_INTERVAL_SECONDS)
+    
+    def start(self) -> None:
+        """在后台构建索引并定期重建"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+template_search_index = TemplateSearchIndex()
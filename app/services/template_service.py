@@ -1,9 +1,71 @@
-from typing import List, Optional
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from beanie import Link
 from beanie.odm.operators.find.comparison import In
+from beanie.odm.queries.find import FindMany
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
-from app.models.template import Template
+from app.core.config import settings
+from app.models.template import Template, TemplateListVersion, TemplateTombstone, TemplateUsageDaily
 from app.models.user import User
 from app.models.game import Game
+from app.schemas.game import GameResponse
+from app.schemas.template import TemplateResponse, TemplateSuggestion
+from app.services.game_registry import game_registry
+from app.services.template_bundles import TemplateBundleService
+from app.services.template_search import template_search_index
+from app.services.template_usage import (
+    daily_usage_operation,
+    template_daily_usage_buffer,
+    template_usage_buffer,
+    usage_day,
+)
+from app.utils.cache import SizedLRUCache, TTLCache
+from app.utils.helpers import link_id, to_naive_utc
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_filter
+
+def _estimate_templates_size(templates: List[Template]) -> int:
+    """粗略估算模板列表占用的内存"""
+    return sum(
+        512 + len(t.title) + len(t.content) + sum(len(tag) for tag in t.tags)
+        for t in templates
+    )
+
+# 公共模板列表缓存，键中包含游戏的版本号，模板变更时递增版本号使旧条目失效；
+# 版本号保存在 TemplateListVersion 中，本进程只缓存 TEMPLATE_LIST_VERSION_TTL_SECONDS
+_public_list_cache = SizedLRUCache(
+    max_bytes=settings.TEMPLATE_LIST_CACHE_MAX_BYTES,
+    ttl=settings.TEMPLATE_LIST_CACHE_TTL_SECONDS,
+    sizeof=_estimate_templates_size,
+)
+_list_versions = TTLCache(maxsize=100000, ttl=settings.TEMPLATE_LIST_VERSION_TTL_SECONDS)
+ALL_GAMES_VERSION_KEY = "*"
+
+async def _list_version(game_id: Optional[str]) -> int:
+    """读取游戏公共模板列表的当前版本号"""
+    key = game_id or ALL_GAMES_VERSION_KEY
+    version = _list_versions.get(key)
+    if version is None:
+        doc = await TemplateListVersion.get_motor_collection().find_one(
+            {"key": key}, projection={"version": 1}
+        )
+        version = doc["version"] if doc else 0
+        _list_versions.set(key, version)
+    return version
+
+# 公共模板列表的排序方式及对应的排序字段
+PUBLIC_SORT_FIELDS = {
+    "usage": "usage_count",
+    "trending": "trending_score",
+}
+
+def _sync_after(field: str, at: datetime, last_id: Optional[ObjectId]) -> Dict[str, Any]:
+    """同步游标之后的记录；last_id 为空表示该时间点的记录已经全部返回"""
+    if last_id is None:
+        return {field: {"$gt": at}}
+    return keyset_filter(field, at, last_id, descending=False)
 
 class TemplateService:
     """模板管理服务"""
@@ -14,36 +76,175 @@ class TemplateService:
         game_id: Optional[str] = None,
         category: Optional[str] = None,
         skip: int = 0,
-        limit: int = 20
+        limit: int = 20,
+        cursor: Optional[str] = None
     ) -> List[Template]:
-        """获取用户的模板列表"""
-        query = Template.find(Template.owner.id == user_id)
+        """
+        获取用户的模板列表，按 (updated_at, _id) 倒序
+        
+        提供 cursor 时使用键集分页并忽略 skip。
+        """
+        query = TemplateService.user_templates_query(user_id, game_id, category, cursor)
+        if not cursor:
+            query = query.skip(skip)
+        return await query.limit(limit).to_list()
+    
+    @staticmethod
+    def user_templates_query(
+        user_id: str,
+        game_id: Optional[str] = None,
+        category: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> FindMany[Template]:
+        """构建用户模板列表查询（不含 skip/limit）"""
+        query = Template.find(Template.owner.id == ObjectId(user_id))
         
         if game_id:
-            query = query.find(Template.game.id == game_id)
+            query = query.find(Template.game.id == ObjectId(game_id))
         
         if category:
             query = query.find(Template.category == category)
         
-        return await query.sort(-Template.updated_at).skip(skip).limit(limit).to_list()
+        if cursor:
+            updated_at, last_id = decode_cursor(cursor)
+            query = query.find(keyset_filter("updated_at", updated_at, last_id))
+        
+        return query.sort(-Template.updated_at, -Template.id)
     
     @staticmethod
     async def get_public_templates(
         game_id: Optional[str] = None,
         category: Optional[str] = None,
         skip: int = 0,
-        limit: int = 20
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        sort: str = "usage"
     ) -> List[Template]:
-        """获取公共模板列表"""
+        """
+        获取公共模板列表（带缓存），按 (usage_count, _id) 倒序；
+        sort="trending" 时按后台计算的 (trending_score, _id) 倒序
+        
+        提供 cursor 时使用键集分页并忽略 skip。
+        """
+        cache_key = (game_id, await _list_version(game_id), category, skip, limit, cursor, sort)
+        templates = _public_list_cache.get(cache_key)
+        if templates is not None:
+            return list(templates)
+        
+        query = TemplateService.public_templates_query(game_id, category, cursor, sort)
+        if not cursor:
+            query = query.skip(skip)
+        
+        templates = await query.limit(limit).to_list()
+        _public_list_cache.set(cache_key, templates)
+        return list(templates)
+    
+    @staticmethod
+    def public_templates_query(
+        game_id: Optional[str] = None,
+        category: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort: str = "usage"
+    ) -> FindMany[Template]:
+        """构建公共模板列表查询（不含 skip/limit）"""
+        field = PUBLIC_SORT_FIELDS[sort]
         query = Template.find(Template.is_public == True)
         
         if game_id:
-            query = query.find(Template.game.id == game_id)
+            query = query.find(Template.game.id == ObjectId(game_id))
         
         if category:
             query = query.find(Template.category == category)
         
-        return await query.sort(-Template.usage_count).skip(skip).limit(limit).to_list()
+        if cursor:
+            value, last_id = decode_cursor(cursor)
+            query = query.find(keyset_filter(field, value, last_id))
+        
+        return query.sort((field, DESCENDING), (Template.id, DESCENDING))
+    
+    @staticmethod
+    async def search_templates(
+        query: str,
+        user_id: str,
+        game_id: Optional[str] = None,
+        limit: int = 10
+    ) -> List[TemplateSuggestion]:
+        """
+        按标题/标签前缀和内容词搜索模板，结果按使用次数排序
+        
+        索引可能尚未同步其他进程的删除或取消公开，返回前按 _id 向数据库确认可见性，
+        并顺便修正本进程索引中的过期条目。
+        """
+        matches = template_search_index.search(
+            query, user_id, game_id=game_id,
+            limit=limit * settings.TEMPLATE_SEARCH_OVERFETCH_FACTOR
+        )
+        if not matches:
+            return []
+        
+        docs = {}
+        async for doc in Template.get_motor_collection().find(
+            {"_id": {"$in": [ObjectId(template_id) for template_id, _ in matches]}},
+            projection={"is_public": 1, "owner": 1, "usage_count": 1}
+        ):
+            docs[str(doc["_id"])] = doc
+        
+        suggestions = []
+        for template_id, entry in matches:
+            doc = docs.get(template_id)
+            template_search_index.apply_visibility(template_id, doc)
+            if doc is None or not (doc.get("is_public") or str(doc["owner"].id) == user_id):
+                continue
+            suggestions.append(TemplateSuggestion(
+                id=template_id,
+                title=entry.title,
+                category=entry.category,
+                game_id=entry.game_id,
+                usage_count=entry.usage_count,
+            ))
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+    
+    @staticmethod
+    def next_user_cursor(templates: List[Template], limit: int) -> Optional[str]:
+        """用户模板列表的下一页游标，没有更多数据时返回 None"""
+        if len(templates) < limit or not templates:
+            return None
+        last = templates[-1]
+        return encode_cursor(last.updated_at, last.id)
+    
+    @staticmethod
+    def next_public_cursor(
+        templates: List[Template], limit: int, sort: str = "usage"
+    ) -> Optional[str]:
+        """公共模板列表的下一页游标，没有更多数据时返回 None"""
+        if len(templates) < limit or not templates:
+            return None
+        last = templates[-1]
+        return encode_cursor(getattr(last, PUBLIC_SORT_FIELDS[sort]), last.id)
+    
+    @staticmethod
+    async def invalidate_public_templates(game_id: Optional[str] = None) -> None:
+        """
+        公共模板变更后使该游戏及全部游戏的列表缓存失效
+        
+        版本号在数据库中递增，本进程立即生效，其他进程在本地版本号过期
+        （TEMPLATE_LIST_VERSION_TTL_SECONDS）后生效。
+        """
+        keys = {game_id or ALL_GAMES_VERSION_KEY, ALL_GAMES_VERSION_KEY}
+        await TemplateListVersion.get_motor_collection().bulk_write([
+            UpdateOne({"key": key}, {"$inc": {"version": 1}}, upsert=True)
+            for key in keys
+        ], ordered=False)
+        for key in keys:
+            _list_versions.pop(key)
+        TemplateBundleService.mark_stale(game_id)
+    
+    @staticmethod
+    def public_cache_metrics() -> Dict[str, float]:
+        """公共模板列表缓存的命中指标"""
+        return _public_list_cache.metrics()
     
     @staticmethod
     async def get_templates_for_game(
@@ -53,43 +254,249 @@ class TemplateService:
         limit: int = 20
     ) -> List[Template]:
         """通过游戏包名获取模板"""
-        game = await Game.find_one(Game.package_name == package_name)
+        game = await game_registry.find_by_package_name(package_name)
         if not game:
             return []
         
         if user_id:
-            # 获取用户的模板和流行的公共模板
-            user_templates = await Template.find(
-                Template.game.id == game.id,
-                Template.owner.id == user_id
+            # 用户自己的模板和流行的公共模板在一次聚合中合并排序
+            return await Template.aggregate(
+                TemplateService.game_templates_pipeline(
+                    game.id, ObjectId(user_id), skip, limit
+                ),
+                projection_model=Template
             ).to_list()
-            
-            # 公共模板数量
-            public_limit = max(0, limit - len(user_templates))
-            
-            if public_limit > 0:
-                # 排除用户已有的模板
-                user_template_ids = [t.id for t in user_templates]
-                public_templates = await Template.find(
-                    Template.game.id == game.id,
-                    Template.is_public == True,
-                    ~In(Template.id, user_template_ids) if user_template_ids else {}
-                ).sort(-Template.usage_count).limit(public_limit).to_list()
-                
-                return user_templates + public_templates
-            return user_templates
         else:
             # 仅返回公共模板
-            return await Template.find(
-                Template.game.id == game.id,
-                Template.is_public == True
-            ).sort(-Template.usage_count).skip(skip).limit(limit).to_list()
-    
-    @staticmethod
-    async def increment_usage_count(template_id: str) -> Optional[Template]:
-        """增加模板使用次数"""
-        template = await Template.get(template_id)
-        if template:
-            template.usage_count += 1
-            await template.save()
-        return template
\ No newline at end of file
+            return await TemplateService.get_public_templates(
+                game_id=str(game.id),
+                skip=skip,
+                limit=limit
+            )
+    
+    @staticmethod
+    def game_templates_pipeline(
+        game_id: ObjectId,
+        user_id: ObjectId,
+        skip: int = 0,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        构建游戏模板的排名合并聚合管道
+        
+        先按使用次数排列用户自己的模板，再排列其他用户的公共模板；
+        每个分支都只取 skip + limit 条，因此开销与用户模板总数无关。
+        
+        用户模板按全局 usage_count 排序而不是按该用户自己的使用次数：系统不记录
+        按用户的使用次数，私有模板的 usage_count 即本人的使用次数，已公开的模板
+        还包含其他用户的使用。$unionWith 需要 MongoDB 4.4 及以上版本。
+        """
+        window = skip + limit
+        order = {"usage_count": DESCENDING, "_id": DESCENDING}
+        return [
+            {"$match": {"owner.$id": user_id, "game.$id": game_id}},
+            {"$sort": order},
+            {"$limit": window},
+            {"$addFields": {"_rank": 0}},
+            {"$unionWith": {
+                "coll": Template.get_settings().name,
+                "pipeline": [
+                    {"$match": {
+                        "is_public": True,
+                        "game.$id": game_id,
+                        "owner.$id": {"$ne": user_id},
+                    }},
+                    {"$sort": order},
+                    {"$limit": window},
+                    {"$addFields": {"_rank": 1}},
+                ],
+            }},
+            {"$sort": {"_rank": 1, **order}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": {"_rank": 0}},
+        ]
+    
+    @staticmethod
+    async def resolve_responses(templates: List[Template]) -> List[TemplateResponse]:
+        """
+        批量解析模板的 game/owner 链接并构建响应
+        
+        游戏优先从注册表读取，其余链接无论页大小只用一次 $in 查询解析；
+        owner_id 直接取自链接引用。
+        """
+        games: Dict[str, Game] = {
+            str(t.game.id): t.game for t in templates if isinstance(t.game, Game)
+        }
+        for t in templates:
+            if isinstance(t.game, Link) and game_registry.ready:
+                game = game_registry.get(t.game.ref.id)
+                if game is not None:
+                    games[str(game.id)] = game
+        missing_ids = {
+            t.game.ref.id for t in templates
+            if isinstance(t.game, Link) and str(t.game.ref.id) not in games
+        }
+        if missing_ids:
+            for game in await Game.find(In(Game.id, list(missing_ids))).to_list():
+                games[str(game.id)] = game
+        
+        responses = []
+        for t in templates:
+            game = games.get(link_id(t.game)) if t.game is not None else None
+            responses.append(TemplateResponse(
+                id=str(t.id),
+                title=t.title,
+                content=t.content,
+                category=t.category,
+                tags=t.tags,
+                is_public=t.is_public,
+                game=GameResponse.parse_obj({**game.dict(), "id": str(game.id)}) if game else None,
+                owner_id=link_id(t.owner),
+                usage_count=t.usage_count,
+                created_at=t.created_at,
+                updated_at=t.updated_at,
+            ))
+        return responses
+    
+    @staticmethod
+    async def record_tombstone(template: Template, unpublished: bool = False) -> None:
+        """记录模板删除（或取消公开），供客户端增量同步"""
+        await TemplateTombstone(
+            template_id=str(template.id),
+            owner_id=link_id(template.owner),
+            game_id=link_id(template.game),
+            was_public=True if unpublished else template.is_public,
+            unpublished=unpublished,
+        ).insert()
+    
+    @staticmethod
+    async def sync_templates(
+        user_id: str,
+        since: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        game_id: Optional[str] = None,
+        limit: int = settings.TEMPLATE_SYNC_PAGE_SIZE
+    ) -> Tuple[List[Template], List[str], datetime, str, bool]:
+        """
+        获取自上次同步以来变更和删除的模板
+        
+        范围为用户自己的模板和公共模板；返回 (变更的模板, 删除的模板 ID, 水位线, 游标, 是否还有更多)。
+        游标分别记录模板 (updated_at, _id) 和墓碑 (deleted_at, _id) 的键集位置，
+        即使大量记录的时间戳相同也能逐页推进；since 仅用于首次按时间开始同步。
+        上界落后当前时间 TEMPLATE_SYNC_LAG_SECONDS，避免漏掉尚未提交的写入。
+        """
+        if cursor:
+            template_at, template_id, deleted_at, tombstone_id = decode_cursor(cursor)
+            template_at, deleted_at = to_naive_utc(template_at), to_naive_utc(deleted_at)
+        else:
+            # 全新客户端从头拉取模板；更早的墓碑已过期删除，从保留期起点开始即可
+            retention = timedelta(days=settings.TEMPLATE_TOMBSTONE_RETENTION_DAYS)
+            template_at = since or datetime.min
+            deleted_at = since or datetime.utcnow() - retention
+            template_id = tombstone_id = None
+        upper = datetime.utcnow() - timedelta(seconds=settings.TEMPLATE_SYNC_LAG_SECONDS)
+        owner = ObjectId(user_id)
+        game_filter = {"game.$id": ObjectId(game_id)} if game_id else {}
+        
+        templates = await Template.find(
+            {"$and": [
+                {"$or": [
+                    {"owner.$id": owner, **game_filter},
+                    {"is_public": True, **game_filter},
+                ]},
+                _sync_after("updated_at", template_at, template_id),
+                {"updated_at": {"$lte": upper}},
+            ]}
+        ).sort([("updated_at", ASCENDING), ("_id", ASCENDING)]).limit(limit).to_list()
+        
+        tombstone_game_filter = {"game_id": game_id} if game_id else {}
+        tombstones = await TemplateTombstone.find(
+            {"$and": [
+                {"$or": [
+                    {"owner_id": user_id, "unpublished": False, **tombstone_game_filter},
+                    {"was_public": True, "owner_id": {"$ne": user_id}, **tombstone_game_filter},
+                ]},
+                _sync_after("deleted_at", deleted_at, tombstone_id),
+                {"deleted_at": {"$lte": upper}},
+            ]}
+        ).sort([("deleted_at", ASCENDING), ("_id", ASCENDING)]).limit(limit).to_list()
+        
+        # 某一侧达到页大小时停在该侧最后一条，否则推进到上界
+        has_more = False
+        if len(templates) == limit:
+            template_at, template_id = templates[-1].updated_at, templates[-1].id
+            has_more = True
+        elif upper > template_at:
+            template_at, template_id = upper, None
+        if len(tombstones) == limit:
+            deleted_at, tombstone_id = tombstones[-1].deleted_at, tombstones[-1].id
+            has_more = True
+        elif upper > deleted_at:
+            deleted_at, tombstone_id = upper, None
+        watermark = min(template_at, deleted_at)
+        next_cursor = encode_cursor(template_at, template_id, deleted_at, tombstone_id)
+        
+        # 同一模板既有更新又有墓碑时以较晚的为准
+        deleted_times = {}
+        for tombstone in tombstones:
+            deleted_times[tombstone.template_id] = max(
+                tombstone.deleted_at, deleted_times.get(tombstone.template_id, datetime.min)
+            )
+        updated_at = {str(t.id): t.updated_at for t in templates}
+        templates = [
+            t for t in templates
+            if t.updated_at > deleted_times.get(str(t.id), datetime.min)
+        ]
+        deleted = [
+            template_id for template_id, at in deleted_times.items()
+            if at >= updated_at.get(template_id, datetime.min)
+        ]
+        return templates, deleted, watermark, next_cursor, has_more
+    
+    @staticmethod
+    def sync_etag(templates: List[Template], deleted: List[str]) -> str:
+        """同步结果的 ETag（不含水位线，内容相同即相同）"""
+        digest = hashlib.sha1()
+        for t in templates:
+            digest.update(f"{t.id}:{t.updated_at.isoformat()}:{t.usage_count};".encode())
+        for template_id in sorted(deleted):
+            digest.update(f"-{template_id};".encode())
+        return f'"{digest.hexdigest()}"'
+    
+    @staticmethod
+    async def increment_usage_count(template_id: str, count: int = 1) -> bool:
+        """原子地增加模板使用次数，返回模板是否存在"""
+        result = await Template.get_motor_collection().update_one(
+            {"_id": ObjectId(template_id)},
+            {"$inc": {"usage_count": count}}
+        )
+        return result.matched_count > 0
+    
+    @staticmethod
+    async def can_use_template(template_id: str, user_id: str) -> bool:
+        """检查模板是否存在且对用户可见（仅查询 _id）"""
+        found = await Template.get_motor_collection().find_one(
+            {
+                "_id": ObjectId(template_id),
+                "$or": [
+                    {"is_public": True},
+                    {"owner.$id": ObjectId(user_id)},
+                ],
+            },
+            projection={"_id": 1}
+        )
+        return found is not None
+    
+    @staticmethod
+    async def record_usage(template_id: str) -> None:
+        """记录一次模板使用（启用聚合时由后台批量写入）"""
+        template_search_index.add_usage(template_id)
+        if settings.TEMPLATE_USAGE_AGGREGATION_ENABLED:
+            await template_usage_buffer.record(template_id)
+            await template_daily_usage_buffer.record(template_id)
+        else:
+            await TemplateService.increment_usage_count(template_id)
+            await TemplateUsageDaily.get_motor_collection().bulk_write(
+                [daily_usage_operation(template_id, usage_day(), 1)]
+            )
\ No newline at end of file
@@ -0,0 +1,203 @@
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from beanie import PydanticObjectId
+from bson import ObjectId
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.models.game import Game
+from app.models.template import Template
+from app.models.user import User
+from app.schemas.template import TemplateImportError, TemplateImportRecord, TemplateImportResult
+from app.services.game_registry import game_registry
+from app.services.template_search import template_search_index
+from app.utils.helpers import is_valid_object_id, link_id
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+    """
+    将字节流切分为行；超过 TEMPLATE_IMPORT_MAX_LINE_BYTES 的行不缓冲，以 None 代替
+    """
+    buffer = b""
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                yield None
+            else:
+                yield line
+        if len(buffer) > settings.TEMPLATE_IMPORT_MAX_LINE_BYTES:
+            buffer = b""
+            skipping = True
+    if skipping:
+        yield None
+    elif buffer:
+        yield buffer
+
+def _export_line(doc: Dict[str, Any], package_names: Dict[ObjectId, str]) -> bytes:
+    game = doc.get("game")
+    game_id = game.id if game is not None else None
+    record = {
+        "id": str(doc["_id"]),
+        "title": doc["title"],
+        "content": doc["content"],
+        "category": doc["category"],
+        "tags": doc.get("tags", []),
+        "is_public": doc.get("is_public", False),
+        "usage_count": doc.get("usage_count", 0),
+        "game_id": str(game_id) if game_id else None,
+        "game_package_name": package_names.get(game_id),
+        "created_at": doc["created_at"].isoformat(),
+        "updated_at": doc["updated_at"].isoformat(),
+    }
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+class TemplateTransferService:
+    """模板 NDJSON 批量导入导出，按批处理，内存占用与数据量无关"""
+
+    @staticmethod
+    async def export_templates(query: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """按 _id 顺序流式导出匹配的模板，每批只查询一次游戏包名"""
+        batch_size = settings.TEMPLATE_TRANSFER_BATCH_SIZE
+        cursor = Template.get_motor_collection().find(
+            query, sort=[("_id", 1)], batch_size=batch_size
+        )
+        batch: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield await TemplateTransferService._export_batch(batch)
+                batch = []
+        if batch:
+            yield await TemplateTransferService._export_batch(batch)
+
+    @staticmethod
+    async def _export_batch(batch: List[Dict[str, Any]]) -> bytes:
+        game_ids = {doc["game"].id for doc in batch if doc.get("game") is not None}
+        package_names = {}
+        if game_ids:
+            async for game in Game.get_motor_collection().find(
+                {"_id": {"$in": list(game_ids)}}, projection={"package_name": 1}
+            ):
+                package_names[game["_id"]] = game["package_name"]
+        return b"".join(_export_line(doc, package_names) for doc in batch)
+
+    @staticmethod
+    def export_user_templates(user_id: str) -> AsyncIterator[bytes]:
+        """导出用户自己的模板"""
+        return TemplateTransferService.export_templates({"owner.$id": ObjectId(user_id)})
+
+    @staticmethod
+    def export_game_templates(game_id: str) -> AsyncIterator[bytes]:
+        """导出游戏的全部公共模板"""
+        return TemplateTransferService.export_templates(
+            {"is_public": True, "game.$id": ObjectId(game_id)}
+        )
+
+    @staticmethod
+    async def import_templates(
+        chunks: AsyncIterator[bytes], owner: User
+    ) -> Tuple[TemplateImportResult, Set[Optional[str]]]:
+        """
+        流式导入 NDJSON 模板，逐行校验，按批 insert_many
+
+        返回导入结果和有公共模板写入的游戏 ID 集合（供调用方使缓存失效）。
+        """
+        result = TemplateImportResult()
+        public_games: Set[Optional[str]] = set()
+        batch: List[Tuple[int, TemplateImportRecord]] = []
+
+        def fail(line_number: int, error: str) -> None:
+            result.failed += 1
+            if len(result.errors) < settings.TEMPLATE_IMPORT_MAX_ERRORS:
+                result.errors.append(TemplateImportError(line=line_number, error=error))
+
+        async def flush() -> None:
+            templates = await TemplateTransferService._build_batch(batch, owner, fail)
+            if templates:
+                await Template.insert_many(templates)
+                for template in templates:
+                    template_search_index.upsert(template)
+                    if template.is_public:
+                        public_games.add(link_id(template.game))
+                result.imported += len(templates)
+            batch.clear()
+
+        line_number = 0
+        async for line in iter_lines(chunks):
+            line_number += 1
+            if line is None:
+                fail(line_number, "Line too long")
+                continue
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, TemplateImportRecord.parse_raw(line)))
+            except (ValidationError, ValueError) as e:
+                fail(line_number, str(e).splitlines()[0])
+                continue
+            if len(batch) >= settings.TEMPLATE_TRANSFER_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
+
+        return result, public_games
+
+    @staticmethod
+    async def _build_batch(
+        batch: List[Tuple[int, TemplateImportRecord]],
+        owner: User,
+        fail: Callable[[int, str], None]
+    ) -> List[Template]:
+        """一次查询解析整批记录引用的游戏，构建待插入的模板"""
+        game_ids = {
+            ObjectId(record.game_id)
+            for _, record in batch
+            if record.game_id and is_valid_object_id(record.game_id)
+        }
+        package_names = {
+            record.game_package_name
+            for _, record in batch
+            if record.game_package_name
+        }
+        games_by_id: Dict[str, Game] = {}
+        games_by_package: Dict[str, Game] = {}
+        if game_registry.ready:
+            for game_id in game_ids:
+                game = game_registry.get(game_id)
+                if game is not None:
+                    games_by_id[str(game_id)] = game
+            for package_name in package_names:
+                game = game_registry.get_by_package_name(package_name)
+                if game is not None:
+                    games_by_package[package_name] = game
+        elif game_ids or package_names:
+            games = await Game.find({"$or": [
+                {"_id": {"$in": list(game_ids)}},
+                {"package_name": {"$in": list(package_names)}},
+            ]}).to_list()
+            for game in games:
+                games_by_id[str(game.id)] = game
+                games_by_package[game.package_name] = game
+
+        templates = []
+        for line_number, record in batch:
+            # 其他部署导出的文件中 game_id 可能不存在，回退到包名
+            game = games_by_id.get(record.game_id) or games_by_package.get(record.game_package_name)
+            if (record.game_id or record.game_package_name) and game is None:
+                fail(line_number, "Game not found")
+                continue
+            templates.append(Template(
+                id=PydanticObjectId(),
+                title=record.title,
+                content=record.content,
+                category=record.category,
+                game=game,
+                owner=owner,
+                tags=record.tags,
+                is_public=record.is_public,
+            ))
+        return templates
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.models.template import Template, TemplateUsageDaily
+from app.services.leader_lease import LeaderLease
+from app.utils.logger import log_error, log_info, log_warning
+
+class TemplateTrendingScorer:
+    """
+    热门分数计算任务
+
+    定期汇总窗口内的按天使用次数，按半衰期指数衰减后写入 Template.trending_score。
+    读取热门排序时只走 (is_public, [game,] [category,] trending_score) 索引，不在请求中计算。
+    多进程部署时由持有租约的进程执行。
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._lease = LeaderLease(
+            "template_trending_scorer", settings.TEMPLATE_TRENDING_INTERVAL_SECONDS * 2
+        )
+
+    @staticmethod
+    def score_pipeline(now: datetime) -> List[dict]:
+        """按模板汇总衰减后的使用次数：每个日桶的权重为 0.5 ^ (距今时长 / 半衰期)"""
+        half_life_ms = settings.TEMPLATE_TRENDING_HALF_LIFE_HOURS * 60 * 60 * 1000
+        window_start = now - timedelta(days=settings.TEMPLATE_TRENDING_WINDOW_DAYS)
+        return [
+            {"$match": {"day": {"$gte": window_start}}},
+            {"$group": {
+                "_id": "$template_id",
+                "score": {"$sum": {"$multiply": [
+                    "$count",
+                    {"$pow": [0.5, {"$divide": [{"$subtract": [now, "$day"]}, half_life_ms]}]},
+                ]}},
+            }},
+        ]
+
+    async def run_once(self) -> int:
+        """重新计算所有模板的热门分数，返回有分数的模板数量"""
+        now = datetime.utcnow()
+        templates = Template.get_motor_collection()
+
+        # 本轮计算出分数的模板记录本轮时间，其余仍有分数的模板随后一次清零
+        scored = 0
+        operations: List[UpdateOne] = []
+        async for doc in TemplateUsageDaily.get_motor_collection().aggregate(
+            self.score_pipeline(now)
+        ):
+            operations.append(UpdateOne(
+                {"_id": ObjectId(doc["_id"])},
+                {"$set": {"trending_score": doc["score"], "trending_run_at": now}}
+            ))
+            scored += 1
+            if len(operations) >= settings.TEMPLATE_TRENDING_BATCH_SIZE:
+                await templates.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await templates.bulk_write(operations, ordered=False)
+
+        # 走 trending_score_active 部分索引，只扫描仍有分数的模板
+        result = await templates.update_many(
+            {"trending_score": {"$gt": 0}, "trending_run_at": {"$ne": now}},
+            {"$set": {"trending_score": 0}}
+        )
+
+        log_info(f"Trending scores updated for {scored} templates, {result.modified_count} reset")
+        return scored
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # 多个 worker 中只有持有租约的一个计算，避免重复聚合和相互覆盖的写入
+                if await self._lease.try_acquire():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log_error("Template trending score update failed", exc_info=True)
+            await asyncio.sleep(settings.TEMPLATE_TRENDING_INTERVAL_SECONDS)
+
+    def start(self) -> None:
+        """启动定期计算任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await self._lease.release()
+            except Exception:
+                log_warning("Failed to release template trending scorer lease")
+
+template_trending_scorer = TemplateTrendingScorer()
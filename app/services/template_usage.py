@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.models.template import Template, TemplateUsageDaily
+from app.services.write_behind import WriteBehindBuffer
+
+class TemplateUsageBuffer(WriteBehindBuffer):
+    """模板使用次数聚合器：累加每个模板的增量，批量以 $inc 写入"""
+    
+    def _merge(self, old: int, new: int) -> int:
+        return old + new
+    
+    def _collection(self) -> AsyncIOMotorCollection:
+        return Template.get_motor_collection()
+    
+    def _build_operations(self, items: Dict[Hashable, Any]) -> List[UpdateOne]:
+        return [
+            UpdateOne({"_id": ObjectId(template_id)}, {"$inc": {"usage_count": delta}})
+            for template_id, delta in items.items()
+        ]
+    
+    async def record(self, template_id: str, count: int = 1) -> None:
+        """记录模板使用"""
+        await self.add_or_write(template_id, count)
+
+def usage_day(at: Optional[datetime] = None) -> datetime:
+    """使用时间所在的 UTC 日桶"""
+    at = at or datetime.utcnow()
+    return datetime(at.year, at.month, at.day)
+
+def daily_usage_operation(template_id: str, day: datetime, count: int) -> UpdateOne:
+    """累加模板某一天使用次数的 upsert 操作"""
+    return UpdateOne(
+        {"template_id": template_id, "day": day},
+        {"$inc": {"count": count}},
+        upsert=True
+    )
+
+class TemplateDailyUsageBuffer(WriteBehindBuffer):
+    """模板按天使用次数聚合器：按 (模板, 日期) 累加，批量 upsert 到日桶"""
+    
+    def _merge(self, old: int, new: int) -> int:
+        return old + new
+    
+    def _collection(self) -> AsyncIOMotorCollection:
+        return TemplateUsageDaily.get_motor_collection()
+    
+    def _build_operations(self, items: Dict[Hashable, Any]) -> List[UpdateOne]:
+        return [
+            daily_usage_operation(template_id, day, count)
+            for (template_id, day), count in items.items()
+        ]
+    
+    async def record(self, template_id: str, count: int = 1) -> None:
+        """记录模板使用"""
+        await self.add_or_write((template_id, usage_day()), count)
+
+template_usage_buffer = TemplateUsageBuffer(
+    flush_interval=settings.TEMPLATE_USAGE_FLUSH_INTERVAL_SECONDS,
+    max_size=settings.TEMPLATE_USAGE_BUFFER_MAX_SIZE,
+)
+
+template_daily_usage_buffer = TemplateDailyUsageBuffer(
+    flush_interval=settings.TEMPLATE_USAGE_FLUSH_INTERVAL_SECONDS,
+    max_size=settings.TEMPLATE_USAGE_BUFFER_MAX_SIZE,
+)
@@ -0,0 +1,148 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from app.utils.logger import log_error, log_warning
+
+class WriteBehindBuffer(ABC):
+    """
+    进程内写缓冲基类
+    
+    合并同一键的重复写入，定期（或缓冲区满时）以一次 bulk_write 刷新到 MongoDB。
+    子类实现 _merge、_collection 和 _build_operations，需要多步写入时可覆盖 _write。
+    缓冲区的键数量不超过 max_size，已满时新键被拒绝，由调用方直接写入或丢弃。
+    
+    写入失败时只重试确定没有生效的键：bulk_write 报告的单条写入错误，以及请求根本
+    没有发出（无可用服务器）的整批。超时等结果未知的错误直接丢弃，避免 $inc 重复计数。
+    """
+    
+    def __init__(self, flush_interval: float, max_size: int):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._pending: Dict[Hashable, Any] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._early_flush: Optional[asyncio.Task] = None
+    
+    @abstractmethod
+    def _merge(self, old: Any, new: Any) -> Any:
+        """合并同一键的两次写入"""
+    
+    @abstractmethod
+    def _collection(self) -> AsyncIOMotorCollection:
+        """写入的目标集合"""
+    
+    @abstractmethod
+    def _build_operations(self, items: Dict[Hashable, Any]) -> List[Any]:
+        """为每个键生成一个写操作，顺序与 items 一致"""
+    
+    async def _write(self, items: Dict[Hashable, Any]) -> List[Hashable]:
+        """
+        写入一批合并后的数据，返回确定未生效、可以重试的键
+        
+        默认以一次无序 bulk_write 执行 _build_operations。
+        """
+        keys = list(items)
+        try:
+            await self._collection().bulk_write(self._build_operations(items), ordered=False)
+        except BulkWriteError as e:
+            # 无序写入中其余操作已经生效，只有 writeErrors 中的操作没有执行
+            failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+            log_warning(f"{type(self).__name__} flush: {len(failed)} of {len(keys)} writes failed")
+            return failed
+        return []
+    
+    def _put(self, key: Hashable, value: Any) -> None:
+        old = self._pending.get(key)
+        self._pending[key] = value if old is None else self._merge(old, value)
+    
+    def add(self, key: Hashable, value: Any) -> bool:
+        """
+        写入缓冲区，返回 False 表示缓冲区已满、新键未被接受
+        
+        达到容量上限时立即安排一次刷新。
+        """
+        accepted = key in self._pending or len(self._pending) < self.max_size
+        if accepted:
+            self._put(key, value)
+        if len(self._pending) >= self.max_size and (
+            self._early_flush is None or self._early_flush.done()
+        ):
+            self._early_flush = asyncio.ensure_future(self.flush())
+        return accepted
+    
+    async def add_or_write(self, key: Hashable, value: Any) -> None:
+        """
+        写入缓冲区；缓冲区已满时直接写入数据库，由调用方承担这次写入的延迟
+        
+        直接写入失败时与 flush 相同处理：确定未生效的写入丢弃并记录，
+        其他错误只记录日志，不让调用方的请求失败。
+        """
+        if self.add(key, value):
+            return
+        try:
+            retry = await self._write({key: value})
+        except Exception:
+            log_error(f"{type(self).__name__} direct write failed, dropped 1 write", exc_info=True)
+            return
+        if retry:
+            # 缓冲区仍然已满，无处放回
+            log_warning(f"{type(self).__name__} dropped {len(retry)} pending writes")
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+    
+    async def flush(self) -> int:
+        """将缓冲区内容批量写入数据库，返回写入的键数量"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            items, self._pending = self._pending, {}
+            try:
+                retry = await self._write(items)
+            except ServerSelectionTimeoutError:
+                # 请求没有发出，整批都可以重试
+                log_error(f"{type(self).__name__} flush failed: no server available")
+                retry = list(items)
+            except Exception:
+                # 结果未知（超时、连接中断等），重试可能重复写入
+                log_error(
+                    f"{type(self).__name__} flush failed, dropped {len(items)} writes with unknown outcome",
+                    exc_info=True
+                )
+                return 0
+            
+            # 放回缓冲区等待下次刷新，超出容量的部分丢弃
+            dropped = 0
+            for key in retry:
+                if key in self._pending or len(self._pending) < self.max_size:
+                    self._put(key, items[key])
+                else:
+                    dropped += 1
+            if dropped:
+                log_warning(f"{type(self).__name__} dropped {dropped} pending writes")
+            return len(items) - len(retry)
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def start(self) -> None:
+        """启动定期刷新任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """停止定期刷新并写入剩余数据"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from app.utils.logger import log_warning
+
+
+class TTLCache:
+    """
+    带过期时间和容量上限的进程内 LRU 缓存
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        获取缓存值，过期或不存在时返回 default
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        删除并返回缓存值
+        """
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        删除所有满足条件的条目，返回删除数量
+        """
+        keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data.keys()))
+
+
+class StaleWhileRevalidateCache:
+    """
+    过期后先返回旧值、在后台刷新的异步缓存
+
+    同一个键的并发加载会合并为一次。标记过期或失效时正在进行的加载被丢弃：
+    它可能读到变更之前的数据，完成后不写入缓存，下次读取会重新加载。
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stale_ttl: float,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.ttl = ttl
+        # 条目在 ttl 内为新鲜，在 ttl + stale_ttl 内可作为旧值返回
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self._cacheable = cacheable
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        current = self._inflight.get(key) is asyncio.current_task()
+        if current and (self._cacheable is None or self._cacheable(value)):
+            self._cache.set(key, (time.monotonic(), value))
+        return value
+
+    def _start_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> "asyncio.Future[Any]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            task.add_done_callback(_log_load_error)
+        return task
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        refresh: bool = False,
+    ) -> Any:
+        """
+        获取缓存值；refresh=True 时跳过缓存并等待重新加载
+        """
+        entry = None if refresh else self._cache.get(key)
+        if entry is None:
+            return await asyncio.shield(self._start_load(key, loader))
+
+        loaded_at, value = entry
+        if time.monotonic() - loaded_at > self.ttl:
+            self._start_load(key, loader)
+        return value
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def invalidate(self, key: Hashable) -> None:
+        self._inflight.pop(key, None)
+        self._cache.pop(key)
+
+    def mark_stale(self, key: Hashable) -> None:
+        """
+        将条目标记为过期：下次读取仍返回旧值，同时触发后台刷新
+        """
+        self._inflight.pop(key, None)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.set(key, (float("-inf"), entry[1]))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+def _log_load_error(task: "asyncio.Future[Any]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        log_warning(f"Cache load failed: {task.exception()}")
+
+
+class SizedLRUCache:
+    """
+    按内存预算淘汰的 LRU 缓存，记录命中和未命中次数
+
+    sizeof 用于估算每个值占用的字节数。
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        获取缓存值，不存在或已过期时返回 None
+        """
+        entry = self._data.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        写入缓存，超出内存预算时淘汰最久未使用的条目
+        """
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + self.ttl, size, value)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.current_bytes = 0
+
+    def metrics(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,177 @@
+"""
+索引校验：在本地 mongod 的临时数据库中写入样例数据，对 TemplateService 的
+每个查询执行 explain()，若获胜计划包含 COLLSCAN 或阻塞 SORT 则以非零状态退出。
+
+用法：python -m app.utils.explain_check [--db florisboard_db_explain] [--keep]
+（--db 必须以 _explain 结尾，脚本开始和结束时都会删除该数据库）
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from beanie import init_beanie
+from beanie.odm.queries.find import FindMany
+from bson import DBRef, ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.models.game import Game
+from app.models.template import Template
+from app.models.user import User
+from app.services.template_service import TemplateService
+from app.utils.pagination import encode_cursor
+
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT"}
+CATEGORIES = ["chat", "trade", "team", "greeting"]
+
+def winning_plans(explain_output: Any) -> List[Dict[str, Any]]:
+    """找出 explain 输出中的所有获胜计划（聚合和 $unionWith 子管道中可能有多个）"""
+    plans = []
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == "winningPlan":
+                plans.append(value)
+            else:
+                plans.extend(winning_plans(value))
+    elif isinstance(explain_output, list):
+        for item in explain_output:
+            plans.extend(winning_plans(item))
+    return plans
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """递归收集执行计划中的所有阶段"""
+    plan = plan.get("queryPlan", plan)
+    stages = [plan.get("stage", "")]
+    if "inputStage" in plan:
+        stages.extend(plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+async def seed(
+    db: AsyncIOMotorDatabase, count: int
+) -> Tuple[List[ObjectId], List[ObjectId]]:
+    """写入样例模板，返回用户和游戏的 ID"""
+    user_ids = [ObjectId() for _ in range(20)]
+    game_ids = [ObjectId() for _ in range(10)]
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        game_id = random.choice(game_ids + [None])
+        updated_at = now - timedelta(minutes=random.randint(0, 100000))
+        docs.append({
+            "title": f"template {i}",
+            "content": f"content {i}",
+            "category": random.choice(CATEGORIES),
+            "game": DBRef(Game.get_settings().name, game_id) if game_id else None,
+            "owner": DBRef(User.get_settings().name, random.choice(user_ids)),
+            "usage_count": random.randint(0, 1000),
+            "trending_score": random.random() * 100,
+            "is_public": random.random() < 0.3,
+            "tags": [],
+            "created_at": updated_at,
+            "updated_at": updated_at,
+        })
+    await db[Template.get_settings().name].insert_many(docs)
+    return user_ids, game_ids
+
+def template_queries(
+    user_id: ObjectId, game_id: ObjectId
+) -> List[Tuple[str, FindMany[Template]]]:
+    """列出 TemplateService 的所有查询形态"""
+    user_cursor = encode_cursor(datetime.utcnow(), ObjectId())
+    public_cursor = encode_cursor(500, ObjectId())
+    queries = []
+    for game, category, paged in product([None, str(game_id)], [None, "chat"], [False, True]):
+        label = f"game={bool(game)} category={bool(category)} cursor={paged}"
+        queries.append((
+            f"user_templates {label}",
+            TemplateService.user_templates_query(
+                str(user_id), game, category, user_cursor if paged else None
+            ),
+        ))
+        for sort in ["usage", "trending"]:
+            queries.append((
+                f"public_templates sort={sort} {label}",
+                TemplateService.public_templates_query(
+                    game, category, public_cursor if paged else None, sort
+                ),
+            ))
+    # 热门分数任务清零本轮未出现的模板（应走 trending_score_active 部分索引）
+    queries.append((
+        "trending_reset",
+        Template.find({"trending_score": {"$gt": 0}, "trending_run_at": {"$ne": datetime.utcnow()}}),
+    ))
+    return queries
+
+def template_pipelines(
+    user_id: ObjectId, game_id: ObjectId
+) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """列出 TemplateService 的聚合管道
+    
+    只检查查询层的获胜计划；管道末尾对两个有界分支的合并排序是预期内的。
+    """
+    return [
+        ("game_templates_pipeline", TemplateService.game_templates_pipeline(game_id, user_id)),
+    ]
+
+async def explain(
+    db: AsyncIOMotorDatabase, query: Union[FindMany[Template], List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    collection = Template.get_settings().name
+    if isinstance(query, list):
+        return await db.command("aggregate", collection, pipeline=query, explain=True)
+    cursor = db[collection].find(query.get_filter_query())
+    if query.sort_expressions:
+        cursor = cursor.sort(query.sort_expressions)
+    return await cursor.limit(20).explain()
+
+async def run(db_name: str, keep: bool, count: int) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        await init_beanie(database=db, document_models=[User, Template, Game])
+        user_ids, game_ids = await seed(db, count)
+        
+        queries = (
+            template_queries(user_ids[0], game_ids[0])
+            + template_pipelines(user_ids[0], game_ids[0])
+        )
+        failures = 0
+        for name, query in queries:
+            result = await explain(db, query)
+            stages = [
+                stage
+                for plan in winning_plans(result)
+                for stage in plan_stages(plan)
+            ]
+            bad = FORBIDDEN_STAGES.intersection(stages)
+            status = "FAIL" if bad else "ok"
+            print(f"[{status}] {name}: {' <- '.join(stages)}")
+            failures += bool(bad)
+        
+        print(f"{failures} of {len(queries)} queries failed")
+        return 1 if failures else 0
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=f"{settings.MONGODB_DB_NAME}_explain")
+    parser.add_argument("--count", type=int, default=5000, help="样例模板数量")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据库")
+    args = parser.parse_args(argv)
+    # 脚本会清空目标数据库，只允许以 _explain 结尾的临时库
+    if args.db == settings.MONGODB_DB_NAME or not args.db.endswith("_explain"):
+        parser.error(f"--db must end with '_explain' and differ from {settings.MONGODB_DB_NAME}")
+    return asyncio.run(run(args.db, args.keep, args.count))
+
+if __name__ == "__main__":
+    sys.exit(main())
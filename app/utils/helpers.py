@@ -1,8 +1,9 @@
 import re
-from typing import Optional
+from typing import Any, Optional
 import random
 import string
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from beanie import Link
 from fastapi.encoders import jsonable_encoder
 
 def slugify(s: str) -> str:
@@ -28,12 +29,30 @@ def is_valid_object_id(id: str) -> bool:
     """
     return bool(re.match(r'^[0-9a-fA-F]{24}$', id))
 
+def link_id(link: Any) -> Optional[str]:
+    """
+    获取 Link 或已加载文档的 ID
+    """
+    if link is None:
+        return None
+    if isinstance(link, Link):
+        return str(link.ref.id)
+    return str(link.id)
+
 def format_datetime(dt: datetime) -> str:
     """
     格式化datetime为用户友好的字符串
     """
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
+def to_naive_utc(dt: datetime) -> datetime:
+    """
+    转换为不带时区的 UTC 时间（与数据库中保存的格式一致）
+    """
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
 def add_time_from_now(minutes: int = 0, hours: int = 0, days: int = 0) -> datetime:
     """
     从现在开始添加指定时间
@@ -53,4 +72,26 @@ def extract_input_context(text: str, max_length: int = 100) -> Optional[str]:
     if not text:
         return None
     # 提取前100个字符作为上下文特征
-    return text[:max_length]
\ No newline at end of file
+    return text[:max_length]
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """
+    判断 Accept-Encoding 是否接受指定编码（q=0 表示明确拒绝，支持 * 通配）
+    """
+    wildcard = None
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == encoding:
+            return q > 0
+        if name == "*":
+            wildcard = q > 0
+    return bool(wildcard)
@@ -0,0 +1,45 @@
+import base64
+from typing import Any, Dict, List, Optional
+
+from bson import json_util
+
+def encode_cursor(*values: Any) -> str:
+    """
+    将排序键的值编码为不透明的游标
+    """
+    raw = json_util.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    解码游标，格式错误时抛出 ValueError
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or not values:
+        raise ValueError("Invalid cursor")
+    return values
+
+def keyset_filter(
+    field: Optional[str], value: Any, last_id: Any, descending: bool = True
+) -> Dict[str, Any]:
+    """
+    生成 (field, _id) 排序下“上一页最后一条之后”的查询条件
+
+    外层的范围条件让查询保持为复合索引上的单个区间扫描，
+    $or 只作为残余过滤条件。
+    """
+    op = "$lt" if descending else "$gt"
+    if field is None:
+        return {"_id": {op: last_id}}
+    range_op = "$lte" if descending else "$gte"
+    return {
+        field: {range_op: value},
+        "$or": [
+            {field: {op: value}},
+            {"_id": {op: last_id}},
+        ],
+    }
@@ -0,0 +1,26 @@
+import hashlib
+from typing import Dict, List
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch 的哈希布局
+
+    计数器以 "行_列" 为键存放在稀疏字典中（只保存非零单元），便于直接用 MongoDB
+    的 $inc 原子累加；估计值只会偏大，不会偏小。
+    """
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+
+    def cells(self, item: str) -> List[str]:
+        """返回元素在每一行对应的计数器键（跨进程稳定的哈希）"""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [f"{row}_{(h1 + row * h2) % self.width}" for row in range(self.depth)]
+
+    def estimate(self, counters: Dict[str, int], item: str) -> int:
+        """估计元素出现次数"""
+        return min(counters.get(cell, 0) for cell in self.cells(item))
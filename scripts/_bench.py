@@ -0,0 +1,39 @@
+"""
+基准脚本共用的工具：临时数据库参数校验和耗时统计
+"""
+import argparse
+import statistics
+import time
+from typing import Any, Awaitable, Callable, List
+
+from app.core.config import settings
+
+def add_db_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--db", default=f"{settings.MONGODB_DB_NAME}_bench")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据库")
+
+def check_db_argument(parser: argparse.ArgumentParser, db_name: str) -> None:
+    """脚本会清空目标数据库，只允许以 _bench 结尾的临时库"""
+    if db_name == settings.MONGODB_DB_NAME or not db_name.endswith("_bench"):
+        parser.error(f"--db must end with '_bench' and differ from {settings.MONGODB_DB_NAME}")
+
+async def time_async(func: Callable[[], Awaitable[Any]], repeat: int) -> List[float]:
+    """重复执行 repeat 次，返回每次耗时（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return samples
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(label: str, samples: List[float]) -> None:
+    """打印耗时的中位数、p95、p99 和最大值（毫秒）"""
+    ordered = sorted(samples)
+    print(
+        f"{label:<40} median={statistics.median(ordered):9.2f}ms "
+        f"p95={percentile(ordered, 0.95):9.2f}ms p99={percentile(ordered, 0.99):9.2f}ms "
+        f"max={ordered[-1]:9.2f}ms (n={len(ordered)})"
+    )
@@ -0,0 +1,92 @@
+"""
+/discord/deeplinks 基准：在临时数据库中写入大量频道访问记录，比较旧查询
+（对全部频道按 last_accessed 排序）与按用户的 (user_id, last_accessed) 索引取前 K 个。
+
+用法：python -m scripts.bench_channel_deeplinks [--channels 1000000] [--users 10000]
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.models.discord import DiscordChannel, DiscordChannelAccess
+from scripts._bench import add_db_argument, check_db_argument, report, time_async
+
+BATCH_SIZE = 10000
+
+async def seed(db: AsyncIOMotorDatabase, channels: int, users: int) -> None:
+    """写入 channels 条访问记录，同时写入同样数量的频道（旧查询的数据形态）"""
+    now = datetime.utcnow()
+    access = db[DiscordChannelAccess.get_settings().name]
+    channel_collection = db[DiscordChannel.get_settings().name]
+    for start in range(0, channels, BATCH_SIZE):
+        access_docs: List[Dict[str, Any]] = []
+        channel_docs: List[Dict[str, Any]] = []
+        for i in range(start, min(start + BATCH_SIZE, channels)):
+            fields = {
+                "channel_id": str(i),
+                "server_id": str(i // 50),
+                "name": f"channel-{i}",
+                "type": "0",
+                "position": i % 50,
+                "deep_link": f"discord://discord.com/channels/{i // 50}/{i}",
+                "last_accessed": now - timedelta(seconds=random.randint(0, 86400 * 30)),
+            }
+            channel_docs.append(dict(fields))
+            access_docs.append({**fields, "user_id": str(i % users)})
+        await channel_collection.insert_many(channel_docs, ordered=False)
+        await access.insert_many(access_docs, ordered=False)
+    print(f"Seeded {channels} channels for {users} users")
+
+async def run(db_name: str, keep: bool, channels: int, users: int, repeat: int, limit: int) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        await init_beanie(database=db, document_models=[DiscordChannel, DiscordChannelAccess])
+        await seed(db, channels, users)
+
+        async def old_query() -> None:
+            await DiscordChannel.find().sort(-DiscordChannel.last_accessed).limit(limit).to_list()
+
+        async def new_query() -> None:
+            await DiscordChannelAccess.find(
+                DiscordChannelAccess.user_id == str(random.randrange(users))
+            ).sort(-DiscordChannelAccess.last_accessed).limit(limit).to_list()
+
+        report("sort all channels (before)", await time_async(old_query, repeat))
+        report("per-user top-K index (after)", await time_async(new_query, repeat))
+
+        explain = await db[DiscordChannelAccess.get_settings().name].find(
+            {"user_id": "0"}
+        ).sort("last_accessed", -1).limit(limit).explain()
+        stats = explain.get("executionStats", {})
+        print(
+            f"after: docs examined={stats.get('totalDocsExamined')} "
+            f"keys examined={stats.get('totalKeysExamined')}"
+        )
+        return 0
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_db_argument(parser)
+    parser.add_argument("--channels", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+    check_db_argument(parser, args.db)
+    return asyncio.run(run(args.db, args.keep, args.channels, args.users, args.repeat, args.limit))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+游戏上下文上报基准：按轮模拟上报流量，每轮提交一个刷新周期的上报后执行一次刷新，
+输出端到端的上报吞吐、提交耗时和刷新耗时（临时数据库）。
+
+用法：python -m scripts.bench_game_contexts [--rate 10000] [--rounds 10] [--games 500]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import List, Optional
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.game import Game, GameContextStats
+from app.services.game_contexts import GameContextBuffer
+from scripts._bench import add_db_argument, check_db_argument, report
+
+async def run(
+    db_name: str, keep: bool, rate: int, rounds: int, games: int, contexts: int
+) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        await init_beanie(database=db, document_models=[Game, GameContextStats])
+        interval = settings.GAME_CONTEXT_FLUSH_INTERVAL_SECONDS
+        buffer = GameContextBuffer(
+            flush_interval=interval,
+            max_size=settings.GAME_CONTEXT_BUFFER_MAX_GAMES,
+            max_per_game=settings.GAME_CONTEXT_MAX_PENDING_PER_GAME,
+        )
+        packages = [f"com.example.game{i}" for i in range(games)]
+        # 上下文频率近似长尾分布
+        weights = [1 / (rank + 1) for rank in range(contexts)]
+        per_round = int(rate * interval)
+
+        submit_ms: List[float] = []
+        flush_ms: List[float] = []
+        started_at = time.perf_counter()
+        for _ in range(rounds):
+            reports = [
+                (random.choice(packages), f"Type a message in channel {context}")
+                for context in random.choices(range(contexts), weights=weights, k=per_round)
+            ]
+            submitted_at = time.perf_counter()
+            for package_name, context in reports:
+                buffer.submit(package_name, context)
+            submit_ms.append((time.perf_counter() - submitted_at) * 1000)
+
+            flushed_at = time.perf_counter()
+            await buffer.flush()
+            flush_ms.append((time.perf_counter() - flushed_at) * 1000)
+        elapsed = time.perf_counter() - started_at
+
+        total = per_round * rounds
+        print(f"{total} reports in {elapsed:.2f}s of work ({total / elapsed:.0f} reports/s)")
+        print(f"accepted={buffer.accepted} rejected={buffer.rejected}")
+        report(f"submit {per_round} reports", submit_ms)
+        report("flush", flush_ms)
+        return 0
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_db_argument(parser)
+    parser.add_argument("--rate", type=int, default=10000, help="每秒上报数")
+    parser.add_argument("--rounds", type=int, default=10, help="刷新周期数")
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--contexts", type=int, default=200, help="每个游戏的不同上下文数")
+    args = parser.parse_args(argv)
+    check_db_argument(parser, args.db)
+    return asyncio.run(run(args.db, args.keep, args.rate, args.rounds, args.games, args.contexts))
+
+if __name__ == "__main__":
+    sys.exit(main())
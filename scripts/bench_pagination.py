@@ -0,0 +1,97 @@
+"""
+分页基准：比较公共模板列表第 1 页与第 N 页在 skip/limit 和键集游标下的耗时。
+
+用法：python -m scripts.bench_pagination [--templates 250000] [--page 10000]
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from beanie import init_beanie
+from bson import DBRef, ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.models.game import Game
+from app.models.template import Template
+from app.models.user import User
+from app.services.template_service import TemplateService
+from app.utils.pagination import encode_cursor
+from scripts._bench import add_db_argument, check_db_argument, report, time_async
+
+BATCH_SIZE = 10000
+
+async def seed(db: AsyncIOMotorDatabase, count: int) -> None:
+    """写入 count 条公共模板"""
+    now = datetime.utcnow()
+    owners = [ObjectId() for _ in range(100)]
+    collection = db[Template.get_settings().name]
+    for start in range(0, count, BATCH_SIZE):
+        await collection.insert_many([
+            {
+                "title": f"template {i}",
+                "content": f"content {i}",
+                "category": "chat",
+                "game": None,
+                "owner": DBRef(User.get_settings().name, random.choice(owners)),
+                "usage_count": random.randint(0, 100000),
+                "trending_score": 0,
+                "is_public": True,
+                "tags": [],
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(start, min(start + BATCH_SIZE, count))
+        ], ordered=False)
+    print(f"Seeded {count} public templates")
+
+async def run(db_name: str, keep: bool, count: int, page: int, limit: int, repeat: int) -> int:
+    skip = (page - 1) * limit
+    if skip >= count:
+        print(f"--templates must exceed {skip} to reach page {page}")
+        return 1
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        await init_beanie(database=db, document_models=[User, Template, Game])
+        await seed(db, count)
+
+        # 第 N 页的游标等于第 N-1 页最后一条的排序键，这里直接取出
+        previous = await TemplateService.public_templates_query().skip(skip - 1).limit(1).to_list()
+        cursor = encode_cursor(previous[0].usage_count, previous[0].id) if previous else None
+
+        async def first_page() -> None:
+            await TemplateService.public_templates_query().limit(limit).to_list()
+
+        async def skip_page() -> None:
+            await TemplateService.public_templates_query().skip(skip).limit(limit).to_list()
+
+        async def cursor_page() -> None:
+            await TemplateService.public_templates_query(cursor=cursor).limit(limit).to_list()
+
+        report("page 1", await time_async(first_page, repeat))
+        report(f"page {page} with skip={skip}", await time_async(skip_page, repeat))
+        report(f"page {page} with cursor", await time_async(cursor_page, repeat))
+        return 0
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_db_argument(parser)
+    parser.add_argument("--templates", type=int, default=250000)
+    parser.add_argument("--page", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+    check_db_argument(parser, args.db)
+    return asyncio.run(run(args.db, args.keep, args.templates, args.page, args.limit, args.repeat))
+
+if __name__ == "__main__":
+    sys.exit(main())
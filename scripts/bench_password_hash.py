@@ -0,0 +1,92 @@
+"""
+密码哈希基准：并发登录/注册（bcrypt）进行期间，持续请求一个与密码无关的轻量接口，
+比较在事件循环中直接执行 bcrypt 与使用 PasswordHasher 线程池时该接口的延迟（含 p99）。
+
+轻量接口是一个只签发 JWT 的 FastAPI 路由，经 httpx 的 ASGI 传输直接调用，
+包含完整的 ASGI 请求处理开销但不经过网络。
+
+用法：python -m scripts.bench_password_hash [--requests 50]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.security import PasswordHasher, create_access_token, get_password_hash
+from scripts._bench import report
+
+probe_app = FastAPI()
+
+@probe_app.get("/ping")
+async def ping():
+    return {"token": create_access_token("bench")}
+
+async def probe_latency(
+    client: httpx.AsyncClient, stop: asyncio.Event, interval: float = 0.005
+) -> List[float]:
+    """每隔 interval 秒发起一次轻量请求，记录每次请求从发出到完成的耗时（毫秒）"""
+    latencies: List[float] = []
+
+    async def one() -> None:
+        started_at = time.perf_counter()
+        response = await client.get("/ping")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started_at) * 1000)
+
+    tasks = []
+    while not stop.is_set():
+        tasks.append(asyncio.ensure_future(one()))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return latencies
+
+async def run_case(
+    client: httpx.AsyncClient, requests: int, hash_password: Callable[[str], Awaitable[str]]
+) -> None:
+    stop = asyncio.Event()
+    prober = asyncio.ensure_future(probe_latency(client, stop))
+    started_at = time.perf_counter()
+    if requests:
+        await asyncio.gather(*(hash_password(f"password-{i}") for i in range(requests)))
+    else:
+        # 空闲基线：只采样一秒
+        await asyncio.sleep(1)
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    latencies = await prober
+    if requests:
+        print(f"  {requests} hashes in {elapsed:.2f}s ({requests / elapsed:.1f}/s)")
+    report("  GET /ping latency", latencies or [0.0])
+
+async def run(requests: int) -> int:
+    async def inline(password: str) -> str:
+        return get_password_hash(password)
+
+    hasher = PasswordHasher(
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    )
+    transport = httpx.ASGITransport(app=probe_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print("idle:")
+        await run_case(client, 0, inline)
+        print("bcrypt on the event loop:")
+        await run_case(client, requests, inline)
+        print(f"PasswordHasher ({settings.PASSWORD_HASH_WORKERS} workers):")
+        await run_case(client, requests, hasher.hash)
+    hasher.shutdown()
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50, help="并发哈希次数")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.requests))
+
+if __name__ == "__main__":
+    sys.exit(main())
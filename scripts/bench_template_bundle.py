@@ -0,0 +1,90 @@
+"""
+模板包基准：比较每次请求查询并序列化游戏模板、构建模板包和命中缓存的模板包的耗时，
+并输出模板包原始与 gzip 后的大小。
+
+用法：python -m scripts.bench_template_bundle [--templates 2000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from beanie import init_beanie
+from bson import DBRef, ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.game import Game
+from app.models.template import Template
+from app.models.user import User
+from app.services.template_bundles import TemplateBundleService
+from app.services.template_service import TemplateService
+from scripts._bench import add_db_argument, check_db_argument, report, time_async
+
+async def run(db_name: str, keep: bool, count: int, repeat: int) -> int:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    await client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        await init_beanie(database=db, document_models=[User, Template, Game])
+        game = await Game(name="Bench Game", package_name="com.example.bench").insert()
+        now = datetime.utcnow()
+        owner = ObjectId()
+        await db[Template.get_settings().name].insert_many([
+            {
+                "title": f"template {i}",
+                "content": f"gg wp, meet at point {i} " * 4,
+                "category": random.choice(["chat", "trade", "team"]),
+                "game": DBRef(Game.get_settings().name, game.id),
+                "owner": DBRef(User.get_settings().name, owner),
+                "usage_count": random.randint(0, 10000),
+                "trending_score": 0,
+                "is_public": True,
+                "tags": ["bench"],
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(count)
+        ])
+        print(f"Seeded {count} public templates for one game")
+
+        async def per_request() -> None:
+            # 改动前的路径：每次请求查询并序列化
+            templates = await TemplateService.public_templates_query(str(game.id)).limit(
+                settings.TEMPLATE_BUNDLE_SIZE
+            ).to_list()
+            json.dumps([t.dict(exclude={"owner", "game"}) for t in templates], default=str)
+
+        async def build() -> None:
+            await TemplateBundleService.build_bundle(game)
+
+        async def cached() -> None:
+            await TemplateBundleService.get_bundle(game)
+
+        report("query + serialize per request", await time_async(per_request, repeat))
+        report("build bundle", await time_async(build, repeat))
+        await cached()
+        report("cached bundle", await time_async(cached, repeat))
+
+        bundle = await TemplateBundleService.get_bundle(game)
+        print(f"bundle size: {len(bundle.body)} bytes, gzip: {len(bundle.gzip_body)} bytes")
+        return 0
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_db_argument(parser)
+    parser.add_argument("--templates", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+    check_db_argument(parser, args.db)
+    return asyncio.run(run(args.db, args.keep, args.templates, args.repeat))
+
+if __name__ == "__main__":
+    sys.exit(main())